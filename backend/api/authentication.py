@@ -0,0 +1,77 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import local_cache, shared_cache
+
+
+def token_cache_key(key):
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    '''
+    Drop the cached users of the tokens once the change is saved.
+    Local tiers of the other processes expire on their own
+    within AUTH_TOKEN_LOCAL_TIMEOUT.
+    '''
+    cache_keys = [token_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def forget():
+        local_cache.delete_many(cache_keys)
+        shared_cache.delete_many(cache_keys)
+    transaction.on_commit(forget)
+
+
+def forget_user_tokens(users):
+    '''
+    Drop the cached tokens of users. Saving a user does it through
+    post_save; call it after changes that skip signals, such as
+    QuerySet.update(is_active=False).
+    '''
+    forget_tokens(
+        Token.objects.filter(user__in=users).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    TokenAuthentication that keeps the user of a token in the local
+    memory tier, then in the shared cache, instead of loading the token
+    with its user on every request.
+    The cached user is a copy: changes that skip post_save are seen
+    only after AUTH_TOKEN_CACHE_TIMEOUT, unless forget_user_tokens
+    is called. Unsafe requests load the user from the database, so a
+    view saving request.user (set_password, users/me/) does not write
+    an old copy over the counters.
+    '''
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        user = local_cache.get(cache_key) if self.use_cache else None
+        if user is None:
+            user = shared_cache.get(cache_key) if self.use_cache else None
+            if user is None:
+                user, token = super().authenticate_credentials(key)
+                shared_cache.set(
+                    cache_key, user, settings.AUTH_TOKEN_CACHE_TIMEOUT
+                )
+            local_cache.set(cache_key, user, settings.AUTH_TOKEN_LOCAL_TIMEOUT)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, self.get_model()(key=key, user=user)
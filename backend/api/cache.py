@@ -0,0 +1,155 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Recipe
+
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+
+shared_cache = caches['default']
+local_cache = caches['local']
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def recipe_namespace(recipe_id):
+    return f'{RECIPES}:{recipe_id}'
+
+
+def get_version(namespace):
+    '''
+    Current version of a namespace.
+    The version is the time of the last change in milliseconds,
+    so it also serves as Last-Modified.
+    '''
+    key = version_key(namespace)
+    version = shared_cache.get(key)
+    if version is None:
+        shared_cache.add(key, int(time.time() * 1000), timeout=None)
+        version = shared_cache.get(key)
+    return version
+
+
+def get_versions(namespaces):
+    '''Versions of several namespaces with one cache round trip.'''
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = shared_cache.get_many(keys)
+    return [
+        versions[key] if key in versions else get_version(namespace)
+        for namespace, key in zip(namespaces, keys)
+    ]
+
+
+def bump_version(*namespaces):
+    '''Drop every cached response depending on one of the namespaces.'''
+    now = int(time.time() * 1000)
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = shared_cache.get_many(keys)
+    shared_cache.set_many({
+        key: max(now, versions.get(key, 0) + 1) for key in keys
+    }, timeout=None)
+
+
+def invalidate_recipe(recipe_id):
+    '''Drop the recipe lists and the recipe page once the data is saved.'''
+    transaction.on_commit(
+        lambda: bump_version(RECIPES, recipe_namespace(recipe_id))
+    )
+
+
+def invalidate_author(author_id):
+    '''
+    Drop the recipe lists and the pages of the author's recipes
+    once the author is saved. Users without recipes change nothing.
+    '''
+    def bump():
+        ids = Recipe.objects.filter(
+            author_id=author_id
+        ).values_list('id', flat=True)
+        namespaces = [recipe_namespace(pk) for pk in ids]
+        if namespaces:
+            bump_version(RECIPES, *namespaces)
+    transaction.on_commit(bump)
+
+
+class CachedReadMixin:
+    '''
+    Serve list & retrieve as rendered JSON stored under versioned keys,
+    first in the local memory tier, then in the shared cache.
+    A key holds the versions of all namespaces the response depends on,
+    so bumping any of them makes the response a miss.
+    The shared tier is the default cache: without CACHE_BACKEND set to
+    a shared server, every process has its own and misses the bumps
+    of the others.
+    '''
+
+    cache_namespace = None
+    cache_timeout = settings.REFERENCE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_namespaces(self):
+        return [self.cache_namespace]
+
+    def can_cache(self, request):
+        return isinstance(request.accepted_renderer, JSONRenderer)
+
+    def caches_response(self, request):
+        return self.action in ('list', 'retrieve') and self.can_cache(request)
+
+    def get_cache_key(self, request, versions):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        versions = '-'.join(str(version) for version in versions)
+        return f'{self.cache_namespace}:{versions}:{path}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.can_cache(request):
+            return handler(request, *args, **kwargs)
+        versions = get_versions(self.get_cache_namespaces())
+        key = self.get_cache_key(request, versions)
+        entry = local_cache.get(key)
+        if entry is None:
+            entry = shared_cache.get(key)
+            if entry is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                content = request.accepted_renderer.render(
+                    response.data, request.accepted_media_type,
+                    self.get_renderer_context()
+                )
+                entry = {
+                    'content': content,
+                    'etag': quote_etag(hashlib.md5(content).hexdigest()),
+                }
+                shared_cache.set(key, entry, self.cache_timeout)
+            local_cache.set(key, entry)
+        last_modified = max(versions) // 1000
+        response = HttpResponse(
+            entry['content'], content_type=request.accepted_renderer.media_type
+        )
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=last_modified,
+            response=response
+        )
@@ -1,20 +1,164 @@
+import binascii
+import re
+from tempfile import SpooledTemporaryFile
 
-import base64
-
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+CHUNK_SIZE = 64 * 1024
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+def decode_base64(encoded):
+    '''
+    Decode base64 text chunk by chunk into a temporary file,
+    which stays in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE.
+    '''
+    file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    pending = ''
+    for start in range(0, len(encoded), CHUNK_SIZE):
+        # Line breaks and other skipped characters would shift the
+        # slices off 4-character quanta: the rest goes to the next one.
+        chunk = pending + NOT_BASE64.sub(
+            '', encoded[start:start + CHUNK_SIZE]
+        )
+        end = len(chunk) - len(chunk) % 4
+        file.write(binascii.a2b_base64(chunk[:end]))
+        pending = chunk[end:]
+    if pending:
+        file.write(binascii.a2b_base64(pending))
+    size = file.tell()
+    file.seek(0)
+    return file, size
+
 
 class Base64ImageField(serializers.ImageField):
     '''
     This class implements decoding base64 string into
     image file.
+    The format and the size are checked from the header first,
+    then the image is decoded once so that a truncated or broken
+    file is refused here, not in the job making the resized copies
+    in recipes.images.
     '''
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_format': 'Формат {image_format} не поддерживается.',
+        'too_large': 'Размер изображения больше {max_side}px.',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            extension = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr),
-                               name=f'temp.{extension}'
-                               )
-        return super().to_internal_value(data)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        try:
+            header, encoded = data.split(';base64,', 1)
+            file, size = decode_base64(encoded)
+        except (ValueError, binascii.Error):
+            self.fail('invalid_image')
+        extension = header.split('/')[-1]
+        upload = UploadedFile(
+            file, name=f'temp.{extension}',
+            content_type=header[len('data:'):], size=size
+        )
+        upload = serializers.FileField.to_internal_value(self, upload)
+        try:
+            image = Image.open(upload)
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        if image.format not in settings.RECIPE_IMAGE_FORMATS:
+            self.fail('invalid_format', image_format=image.format)
+        if max(image.size) > settings.RECIPE_IMAGE_MAX_SIDE:
+            self.fail('too_large', max_side=settings.RECIPE_IMAGE_MAX_SIDE)
+        try:
+            image.load()
+        except (OSError, SyntaxError, ValueError):
+            self.fail('invalid_image')
+        upload.image = image
+        upload.seek(0)
+        return upload
+
+
+def image_variant_urls(image, variants, request=None):
+    '''
+    URLs of the resized copies of the stored image named image,
+    the original one stands in for the copies that are not ready.
+    '''
+    if not image:
+        return None
+    if variants.get('source') != image:
+        variants = {}
+    urls = {}
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        for key in (variant, f'{variant}_webp'):
+            url = default_storage.url(variants.get(key) or image)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[key] = url
+    return urls
+
+
+class ImageVariantsField(serializers.Field):
+    '''
+    URLs of the resized copies of a recipe image.
+    Until they are ready the original image is given instead.
+    '''
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return image_variant_urls(
+            recipe.image.name, recipe.image_variants,
+            self.context.get('request')
+        )
+
+
+class PrimaryKeyListField(serializers.ListField):
+    '''
+    This class resolves a list of primary keys
+    into objects with a single query.
+    Errors are those of PrimaryKeyRelatedField(many=True),
+    with every unknown key reported at once.
+    '''
+    default_error_messages = {
+        'does_not_exist': serializers.PrimaryKeyRelatedField
+        .default_error_messages['does_not_exist'],
+        'incorrect_type': serializers.PrimaryKeyRelatedField
+        .default_error_messages['incorrect_type'],
+        'not_unique': 'Значения должны быть уникальными!',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def run_child_validation(self, data):
+        pk_field = self.queryset.model._meta.pk
+        ids = []
+        for pk in data:
+            try:
+                ids.append(pk_field.to_python(pk))
+            except (TypeError, ValueError, ValidationError):
+                self.fail('incorrect_type', data_type=type(pk).__name__)
+        return ids
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        if len(set(ids)) != len(ids):
+            self.fail('not_unique')
+        objects = self.queryset.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError([
+                self.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ], code='does_not_exist')
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, data):
+        return [obj.pk for obj in data.all()]
@@ -1,15 +1,21 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filter
 
-from recipes.models import Recipe, Tag, Ingredient
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeTag,
+                            ShoppingCart, Tag)
+from recipes.search import search_ingredients, search_recipes
 
 
 class IngredientFilter(filter.FilterSet):
-    name = filter.CharFilter(field_name='name', lookup_expr='icontains')
+    name = filter.CharFilter(method='search_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
 
+    def search_name(self, queryset, name, value):
+        return search_ingredients(queryset, value)
+
 
 class RecipeFilter(filter.FilterSet):
     author = filter.CharFilter()
@@ -17,22 +23,46 @@ class RecipeFilter(filter.FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         label='Tags',
-        to_field_name='slug'
+        to_field_name='slug',
+        method='get_tags'
     )
     is_favorited = filter.BooleanFilter(method='get_favorite')
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filter.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
 
     def get_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite_recipe__user=self.request.user)
-        return queryset
+        if not value:
+            return queryset
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(Favorite.objects.filter(
+            recipe=OuterRef('pk'), user=self.request.user
+        )))
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return queryset
+        if not value:
+            return queryset
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(ShoppingCart.objects.filter(
+            recipe=OuterRef('pk'), user=self.request.user
+        )))
+
+    def get_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
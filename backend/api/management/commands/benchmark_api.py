@@ -0,0 +1,385 @@
+import json
+import math
+import shutil
+import tempfile
+from contextlib import ExitStack
+from io import StringIO
+from time import perf_counter
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (DEFAULT_DB_ALIAS, close_old_connections, connection,
+                       connections)
+from django.db.backends.signals import connection_created
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes import workers
+from recipes.management.commands.generate_data import PASSWORD
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    '''
+    Drive every API route through the test client on a throwaway
+    test database and record query counts, new database connections,
+    latency and payload size.
+    '''
+
+    help = 'Benchmark API endpoints and compare against a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Requests per endpoint.'
+        )
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Where to write the results as JSON.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results of a previous run to compare against.'
+        )
+        parser.add_argument(
+            '--query-tolerance', type=int, default=0,
+            help='Extra queries per request allowed over the baseline.'
+        )
+        parser.add_argument(
+            '--latency-tolerance', type=float,
+            help='Fail when p95 grows more than this factor, e.g. 1.5.'
+        )
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Keep response caches between requests.'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        for alias in connections:
+            test_settings = connections[alias].settings_dict['TEST']
+            if test_settings.get('MIRROR') == DEFAULT_DB_ALIAS:
+                connections[alias].creation.set_as_test_mirror(
+                    connection.settings_dict
+                )
+        # Background jobs run between the requests, in this thread:
+        # they are not part of the request, and the in-memory SQLite
+        # test database locks whole tables against concurrent writers.
+        workers.hold()
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                call_command(
+                    'generate_data',
+                    users=options['users'],
+                    recipes=options['recipes'],
+                    seed=options['seed'],
+                    stdout=StringIO()
+                )
+                clients, user, auth_user = self.get_clients()
+                scenarios = self.get_scenarios(user, auth_user)
+                workers.run_held()
+                self.check_parity(clients, scenarios)
+                results = self.run_scenarios(clients, scenarios, options)
+        finally:
+            workers.shutdown()
+            shutil.rmtree(media_root, ignore_errors=True)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report = {
+            'database': connection.vendor,
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        self.print_report(results)
+        if options['baseline']:
+            self.compare(results, options)
+
+    def authenticate(self, client, key):
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def get_clients(self):
+        '''
+        Anonymous, the user most requests are made by and
+        a user of its own for login, password change and logout.
+        '''
+        user = User.objects.filter(
+            follower__isnull=False, favorite_recipe__isnull=False,
+            shopping_cart__isnull=False
+        ).order_by('id').first()
+        auth_user = User.objects.exclude(pk=user.pk).order_by('-id').first()
+        clients = {'anon': APIClient(), 'user': APIClient(),
+                   'auth': APIClient()}
+        for name, owner in (('user', user), ('auth', auth_user)):
+            token, _ = Token.objects.get_or_create(user=owner)
+            self.authenticate(clients[name], token.key)
+        return clients, user, auth_user
+
+    def get_scenarios(self, user, auth_user):
+        recipe = Recipe.objects.exclude(author=user).order_by('id').first()
+        author = recipe.author
+        Favorite.objects.filter(user=user, recipe=recipe).delete()
+        ShoppingCart.objects.filter(user=user, recipe=recipe).delete()
+        Follow.objects.filter(user=user, author=author).delete()
+        tags = list(Tag.objects.values_list('id', 'slug'))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        on_hand = ','.join(
+            str(pk) for pk in recipe.ingredients.values_list('id', flat=True)
+        )
+        recipe_data = {
+            'ingredients': [
+                {'id': ingredient, 'amount': num + 1}
+                for num, ingredient in enumerate(ingredients[:10])
+            ],
+            'tags': [tags[0][0]],
+            'image': PIXEL,
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        update_data = dict(recipe_data, ingredients=[
+            {'id': ingredient, 'amount': num + 2}
+            for num, ingredient in enumerate(ingredients[5:15])
+        ])
+        created = '/api/recipes/{recipe_id}/'
+        return [
+            ('tags_list', 'anon', 'get', '/api/tags/', None),
+            ('tags_detail', 'anon', 'get', f'/api/tags/{tags[0][0]}/', None),
+            ('ingredients_list', 'anon', 'get', '/api/ingredients/', None),
+            ('ingredients_search', 'anon', 'get',
+             '/api/ingredients/?name=мо', None),
+            ('ingredients_detail', 'anon', 'get',
+             f'/api/ingredients/{ingredients[0]}/', None),
+            ('recipes_list_anon', 'anon', 'get',
+             '/api/recipes/?page_size=100', None),
+            ('recipes_list', 'user', 'get',
+             '/api/recipes/?page_size=100', None),
+            ('recipes_list_tags', 'user', 'get',
+             f'/api/recipes/?tags={tags[0][1]}&tags={tags[1][1]}', None),
+            ('recipes_list_author', 'user', 'get',
+             f'/api/recipes/?author={recipe.author_id}', None),
+            ('recipes_list_trending', 'anon', 'get',
+             '/api/recipes/?ordering=-trending_score', None),
+            ('recipes_list_favorited', 'user', 'get',
+             '/api/recipes/?is_favorited=1', None),
+            ('recipes_list_in_cart', 'user', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None),
+            ('recipes_search', 'user', 'get',
+             '/api/recipes/?search=рецепт описание', None),
+            ('recipes_cookable', 'user', 'get',
+             f'/api/recipes/cookable/?ingredients={on_hand}', None),
+            ('recipes_feed', 'user', 'get', '/api/recipes/feed/', None),
+            ('recipes_list_cursor', 'user', 'get',
+             '/api/recipes/?cursor=&page_size=100', None),
+            ('recipes_detail', 'user', 'get',
+             f'/api/recipes/{recipe.id}/', None),
+            ('recipe_create', 'user', 'post', '/api/recipes/', recipe_data),
+            ('recipe_update', 'user', 'patch', created, update_data),
+            ('recipe_delete', 'user', 'delete', created, None),
+            ('favorite_add', 'user', 'post',
+             f'/api/recipes/{recipe.id}/favorite/', None),
+            ('favorite_remove', 'user', 'delete',
+             f'/api/recipes/{recipe.id}/favorite/', None),
+            ('shopping_cart_add', 'user', 'post',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('shopping_cart_remove', 'user', 'delete',
+             f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('download_shopping_cart_txt', 'user', 'get',
+             '/api/recipes/download_shopping_cart/?format=txt', None),
+            ('download_shopping_cart_csv', 'user', 'get',
+             '/api/recipes/download_shopping_cart/?format=csv', None),
+            ('download_shopping_cart_pdf', 'user', 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf', None),
+            ('subscribe', 'user', 'post',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('unsubscribe', 'user', 'delete',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('subscriptions', 'user', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None),
+            ('users_list', 'anon', 'get', '/api/users/', None),
+            ('users_list_auth', 'user', 'get',
+             '/api/users/?page_size=100', None),
+            ('users_me', 'user', 'get', '/api/users/me/', None),
+            ('users_register', 'anon', 'post', '/api/users/', {
+                'email': 'benchmark{run}@example.com',
+                'username': 'benchmark{run}',
+                'first_name': 'Имя',
+                'last_name': 'Фамилия',
+                'password': PASSWORD,
+            }),
+            ('users_detail', 'user', 'get',
+             f'/api/users/{recipe.author_id}/', None),
+            ('token_login', 'anon', 'post', '/api/auth/token/login/',
+             {'email': auth_user.email, 'password': PASSWORD}),
+            ('users_me_update', 'auth', 'patch', '/api/users/me/',
+             {'first_name': 'Имя'}),
+            ('set_password', 'auth', 'post', '/api/users/set_password/',
+             {'current_password': PASSWORD, 'new_password': PASSWORD}),
+            ('token_logout', 'auth', 'post', '/api/auth/token/logout/', None),
+        ]
+
+    def request(self, client, method, path, data):
+        response = getattr(client, method)(path, data=data, format='json')
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response, size
+
+    def check_parity(self, clients, scenarios):
+        '''Responses of the row readers must match the serializers.'''
+        mismatches = []
+        for name, client, method, path, data in scenarios:
+            if method != 'get':
+                continue
+            contents = []
+            for fast_reads in (False, True):
+                for cache in caches.all():
+                    cache.clear()
+                with override_settings(API_FAST_READS=fast_reads):
+                    response = clients[client].get(path)
+                if response.streaming:
+                    break
+                contents.append(response.content)
+            if len(contents) == 2 and contents[0] != contents[1]:
+                mismatches.append(name)
+        if mismatches:
+            raise CommandError(
+                'Row readers differ from the serializers: '
+                + ', '.join(mismatches)
+            )
+
+    def count_connection(self, **kwargs):
+        self.connections += 1
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def run_scenarios(self, clients, scenarios, options):
+        measures = {name: [] for name, *_ in scenarios}
+        state = {'recipe_id': 0}
+        connection_created.connect(self.count_connection)
+        for run in range(options['repeat']):
+            state['run'] = run
+            for name, client, method, path, data in scenarios:
+                if not options['warm_cache']:
+                    for cache in caches.all():
+                        cache.clear()
+                path = path.format(**state)
+                if name == 'users_register':
+                    data = {
+                        key: value.format(**state)
+                        for key, value in data.items()
+                    }
+                self.connections = self.queries = 0
+                started = perf_counter()
+                with ExitStack() as stack:
+                    for alias in connections:
+                        stack.enter_context(
+                            connections[alias].execute_wrapper(
+                                self.count_query
+                            )
+                        )
+                    response, size = self.request(
+                        clients[client], method, path, data
+                    )
+                    elapsed = perf_counter() - started
+                workers.run_held()
+                # The test client keeps connections open, a server
+                # closes them after the request unless CONN_MAX_AGE.
+                close_old_connections()
+                if name == 'recipe_create' and response.status_code == 201:
+                    state['recipe_id'] = response.json()['id']
+                if name == 'token_login' and response.status_code == 200:
+                    self.authenticate(
+                        clients['auth'], response.json()['auth_token']
+                    )
+                measures[name].append((
+                    response.status_code, self.queries, elapsed, size,
+                    self.connections
+                ))
+        connection_created.disconnect(self.count_connection)
+        return {
+            name: {
+                'status': sorted({status for status, *_ in rows}),
+                'queries': max(count for _, count, *_ in rows),
+                'connections': max(row[4] for row in rows),
+                'p50_ms': round(
+                    percentile([row[2] for row in rows], 50) * 1000, 3),
+                'p95_ms': round(
+                    percentile([row[2] for row in rows], 95) * 1000, 3),
+                'bytes': max(row[3] for row in rows),
+            }
+            for name, rows in measures.items()
+        }
+
+    def print_report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<30}{"status":>10}{"queries":>9}{"conns":>7}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"bytes":>10}'
+        )
+        for name, row in results.items():
+            status = ','.join(str(code) for code in row['status'])
+            self.stdout.write(
+                f'{name:<30}{status:>10}{row["queries"]:>9}'
+                f'{row["connections"]:>7}'
+                f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["bytes"]:>10}'
+            )
+
+    def compare(self, results, options):
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        failures = []
+        for name, base in baseline.items():
+            current = results.get(name)
+            if current is None:
+                failures.append(f'{name}: missing from this run')
+                continue
+            if current['status'] != base['status']:
+                failures.append(
+                    f'{name}: status {current["status"]}, '
+                    f'baseline {base["status"]}'
+                )
+            allowed = base['queries'] + options['query_tolerance']
+            if current['queries'] > allowed:
+                failures.append(
+                    f'{name}: {current["queries"]} queries, '
+                    f'baseline {base["queries"]}'
+                )
+            tolerance = options['latency_tolerance']
+            if tolerance and current['p95_ms'] > base['p95_ms'] * tolerance:
+                failures.append(
+                    f'{name}: p95 {current["p95_ms"]} ms, '
+                    f'baseline {base["p95_ms"]} ms'
+                )
+        if failures:
+            raise CommandError(
+                'Regressions against the baseline:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
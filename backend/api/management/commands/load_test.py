@@ -0,0 +1,134 @@
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException
+from itertools import cycle
+from time import perf_counter, sleep
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark_api import percentile
+from recipes.models import Ingredient, Recipe, Tag
+
+
+class Command(BaseCommand):
+    '''
+    Load a running server, e.g. one backend container, with concurrent
+    keep-alive clients and report the throughput. Slow clients that
+    trickle a request body can be added to show how the worker model
+    copes with them.
+    '''
+
+    help = 'Measure requests per second of a running API server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to run for.'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Connections sending a request body one byte a second.'
+        )
+        parser.add_argument(
+            '--token',
+            help='Auth token, anonymous responses are served from cache.'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request, the hot read endpoints by default.'
+        )
+        parser.add_argument('--output', help='Write the results as JSON.')
+
+    def get_paths(self):
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        if None in (tag, ingredient, recipe):
+            raise CommandError('Fill the database first, see generate_data.')
+        return [
+            f'/api/tags/{tag.pk}/',
+            f'/api/ingredients/{ingredient.pk}/',
+            f'/api/recipes/{recipe.pk}/',
+        ]
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.headers = {'Accept': 'application/json'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        paths = options['paths'] or self.get_paths()
+        self.deadline = perf_counter() + options['duration']
+        self.lock = threading.Lock()
+        self.latencies, self.errors = [], 0
+        slow = [
+            threading.Thread(target=self.slow_client, daemon=True)
+            for _ in range(options['slow_clients'])
+        ]
+        for thread in slow:
+            thread.start()
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for _ in range(options['concurrency']):
+                pool.submit(self.client, paths)
+        elapsed = perf_counter() - started
+        if not self.latencies:
+            raise CommandError(f'No successful requests, {self.errors} errors')
+        report = {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'rps': round(len(self.latencies) / elapsed, 1),
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 3),
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        for key, value in report.items():
+            self.stdout.write(f'{key:<10}{value:>12}')
+
+    def client(self, paths):
+        connection = HTTPConnection(self.host, self.port, timeout=30)
+        latencies, errors = [], 0
+        for path in cycle(paths):
+            if perf_counter() >= self.deadline:
+                break
+            started = perf_counter()
+            try:
+                connection.request('GET', path, headers=self.headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, HTTPException):
+                errors += 1
+                connection.close()
+                continue
+            if response.status == 200:
+                latencies.append(perf_counter() - started)
+            else:
+                errors += 1
+        connection.close()
+        with self.lock:
+            self.latencies += latencies
+            self.errors += errors
+
+    def slow_client(self):
+        while perf_counter() < self.deadline:
+            try:
+                with socket.create_connection((self.host, self.port)) as sock:
+                    sock.sendall(
+                        b'POST /api/recipes/ HTTP/1.1\r\n'
+                        + f'Host: {self.host}\r\n'.encode()
+                        + b'Content-Type: application/json\r\n'
+                        + b'Content-Length: 1000000\r\n\r\n'
+                    )
+                    while perf_counter() < self.deadline:
+                        sock.sendall(b' ')
+                        sleep(1)
+            except OSError:
+                sleep(1)
@@ -1,6 +1,197 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import read_feed
+from recipes.search import by_position
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     page_size = 6
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Cursor pagination on the ordering of the queryset, such as
+    ?ordering=-favorites_count, or on the view's cursor_ordering
+    when the queryset is not ordered. id is added as the tiebreaker.
+    The next page is selected with a WHERE on the last row of the
+    current one instead of OFFSET, and no COUNT is made.
+    Orderings on expressions (search rank, cookable matches)
+    have no row values to continue from and are rejected.
+    '''
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 6
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    invalid_ordering_message = (
+        'Постраничный вывод через cursor не поддерживает эту сортировку.'
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.fields = self.get_fields(
+            queryset.query.order_by
+            or getattr(view, 'cursor_ordering', self.ordering)
+        )
+        page_size = self.get_page_size(request)
+        queryset = self.with_position(queryset).order_by(*(
+            f'-{name}' if descending else name
+            for name, descending in self.fields
+        ))
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_fields(self, ordering):
+        '''(field name, descending) for ordering, ending with id.'''
+        fields = []
+        for term in ordering:
+            if not isinstance(term, str) or term.startswith('?'):
+                self.invalid_ordering()
+            name = term.lstrip('-')
+            if name == 'pk':
+                name = self.model._meta.pk.name
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                self.invalid_ordering()
+            if not field.concrete or field.is_relation or field.null:
+                self.invalid_ordering()
+            fields.append((name, term.startswith('-')))
+        pk = self.model._meta.pk.name
+        if pk not in (name for name, _ in fields):
+            fields.append((pk, True))
+        return fields
+
+    def invalid_ordering(self):
+        raise exceptions.ValidationError(
+            {self.cursor_query_param: self.invalid_ordering_message}
+        )
+
+    def with_position(self, queryset):
+        '''
+        Rows carry the values of the ordering fields, also when they
+        are .values() rows of a reader without these columns.
+        '''
+        return queryset.annotate(**{
+            f'keyset_{name}': F(name) for name, _ in self.fields
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def after(self, position):
+        '''Rows following position: a < x OR (a = x AND b < y) ...'''
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.fields, position):
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError(encoded)
+            return [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj):
+        if not isinstance(obj, dict):
+            obj = vars(obj)
+        position = self.model(**{
+            name: obj[f'keyset_{name}'] for name, _ in self.fields
+        })
+        values = [
+            self.model._meta.get_field(name).value_to_string(position)
+            for name, _ in self.fields
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class RecipePagination(CustomPagination):
+    '''
+    Page number pagination by default,
+    keyset pagination when the request has a cursor parameter
+    (an empty ?cursor= starts from the first page).
+    '''
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(KeysetPagination):
+    '''
+    Keyset pagination over the feed of the current user.
+    Recipe ids come from read_feed, the page is then loaded
+    from the given queryset in feed order.
+    '''
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.fields = self.get_fields(self.ordering)
+        page_size = self.get_page_size(request)
+        ids = read_feed(
+            request.user, self.decode_cursor(request), page_size + 1
+        )
+        self.has_next = len(ids) > page_size
+        ids = ids[:page_size]
+        self.page = list(
+            by_position(self.with_position(queryset), ids)
+        ) if ids else []
+        return self.page
@@ -0,0 +1,73 @@
+from django.db import models
+from rest_framework import serializers
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWS = 'follows'
+
+
+class UserRelations:
+    '''
+    Favorite recipes, cart recipes and followed authors of the current
+    user. Ids are checked in batches, one query per relation for
+    all objects on a page, and then answered from sets.
+    '''
+    sources = {
+        FAVORITES: (Favorite, 'recipe_id'),
+        CART: (ShoppingCart, 'recipe_id'),
+        FOLLOWS: (Follow, 'author_id'),
+    }
+
+    def __init__(self, user):
+        self.user = user
+        self.checked = {name: set() for name in self.sources}
+        self.related = {name: set() for name in self.sources}
+
+    def load(self, relation, ids):
+        ids = set(ids) - self.checked[relation]
+        if not ids or self.user.is_anonymous:
+            return
+        model, field = self.sources[relation]
+        self.related[relation].update(model.objects.filter(
+            user=self.user, **{f'{field}__in': ids}
+        ).values_list(field, flat=True))
+        self.checked[relation] |= ids
+
+    def has(self, relation, pk):
+        if self.user.is_anonymous:
+            return False
+        self.load(relation, [pk])
+        return pk in self.related[relation]
+
+
+def get_relations(request):
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = UserRelations(request.user)
+        request._user_relations = relations
+    return relations
+
+
+class RelationListSerializer(serializers.ListSerializer):
+    '''
+    Load the relations listed in the child's Meta.relations
+    as (relation, id attribute, annotation) for the whole list at once,
+    skipping objects that already have the annotation.
+    '''
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        objects = list(data)
+        request = self.context.get('request')
+        if request is not None and not request.user.is_anonymous:
+            relations = get_relations(request)
+            for relation, attribute, annotation in self.child.Meta.relations:
+                relations.load(relation, {
+                    getattr(obj, attribute) for obj in objects
+                    if not hasattr(obj, annotation)
+                })
+        return super().to_representation(objects)
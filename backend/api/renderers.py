@@ -0,0 +1,142 @@
+import csv
+import io
+import os
+
+import orjson
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+SHOPPING_LIST_TITLE = 'Cписок покупок:'
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    '''
+    The output of JSONRenderer written by orjson.
+    Dates and types orjson does not know go through the encoder
+    of the stock renderer, indented output is left to it.
+    '''
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or not self.compact or self.ensure_ascii:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        content = orjson.dumps(
+            data, default=self.encoder.default, option=ORJSON_OPTIONS
+        )
+        return content.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    '''
+    Base class for shopping list exporters.
+    Rows are aggregated ingredients with the keys
+    ingredient__name, ingredient__measurement_unit and amount.
+    '''
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.stream(data))
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield SHOPPING_LIST_TITLE.encode(self.charset)
+        for row in rows:
+            yield (
+                f"\n{row['ingredient__name']} - "
+                f"{row['amount']} {row['ingredient__measurement_unit']}"
+            ).encode(self.charset)
+
+
+class _Echo:
+    '''File-like object that hands back whatever is written to it.'''
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(
+            ('name', 'amount', 'measurement_unit')
+        ).encode(self.charset)
+        for row in rows:
+            yield writer.writerow((
+                row['ingredient__name'],
+                row['amount'],
+                row['ingredient__measurement_unit'],
+            )).encode(self.charset)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    '''
+    PDF is written page by page with reportlab,
+    the finished document is sent in chunks.
+    '''
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    line_height = 18
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return 'Helvetica'
+        if 'ShoppingListFont' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('ShoppingListFont', font_path))
+        return 'ShoppingListFont'
+
+    def stream(self, rows):
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        y = height - self.margin
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, y, SHOPPING_LIST_TITLE)
+        y -= self.line_height * 2
+        pdf.setFont(font, self.font_size)
+        for num, row in enumerate(rows, start=1):
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y,
+                f"{num}. {row['ingredient__name']} - "
+                f"{row['amount']} {row['ingredient__measurement_unit']}"
+            )
+            y -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(self.chunk_size), b'')
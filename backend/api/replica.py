@@ -0,0 +1,55 @@
+from asgiref.sync import sync_to_async
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.db import is_pinned, pin_primary, read_from_replica
+
+from .cache import CachedReadMixin
+
+
+class ReplicaReadMixin:
+    '''
+    Safe requests read from the replica, except right after the user
+    wrote something and when the response is stored in the shared
+    cache, where a lagging replica would keep it stale.
+    '''
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS or is_pinned(request.user):
+            return False
+        return not (isinstance(self, CachedReadMixin)
+                    and self.caches_response(request))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        read_from_replica(self.reads_from_replica(request))
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_from_replica(False)
+
+
+class PinPrimaryMiddleware(MiddlewareMixin):
+    '''
+    Pin the reads of a user to the primary after a successful write.
+    Works under ASGI without a thread hop for safe requests.
+    '''
+
+    def pin(self, request, response):
+        user = getattr(request, 'user', None)
+        if (response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_primary(user)
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS:
+            self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.pin)(request, response)
+        return response
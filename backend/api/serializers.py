@@ -1,7 +1,12 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers, validators
 
-from api.field import Base64ImageField
+from api.field import (Base64ImageField, ImageVariantsField,
+                       PrimaryKeyListField)
+from api.relations import (CART, FAVORITES, FOLLOWS, RelationListSerializer,
+                           get_relations)
 from users.models import User, Follow
 from recipes.models import (
     Tag, Recipe, Ingredient,
@@ -35,20 +40,20 @@ class UsersManageSerializer(serializers.ModelSerializer):
             'id',
             'username',
             'email',
-            'password',
             'first_name',
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = RelationListSerializer
+        relations = ((FOLLOWS, 'pk', 'is_subscribed'),)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return Follow.objects.filter(
-            user=request.user,
-            author=obj
-        ).exists()
+        return get_relations(request).has(FOLLOWS, obj.pk)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -96,9 +101,14 @@ class RecipeSerialiser(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, read_only=True)
     author = UsersManageSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField()
+    ingredients = IngredientAmountSerializer(
+        source='ingredientrecipe_set',
+        many=True,
+        read_only=True
+    )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -111,35 +121,52 @@ class RecipeSerialiser(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time'
         )
+        list_serializer_class = RelationListSerializer
+        relations = (
+            (FAVORITES, 'pk', 'is_favorited'),
+            (CART, 'pk', 'is_in_shopping_cart'),
+            (FOLLOWS, 'author_id', 'is_author_subscribed'),
+        )
 
-    def get_ingredients(self, obj):
-        ingredients = IngredientRecipe.objects.filter(recipe=obj)
-        return IngredientAmountSerializer(ingredients, many=True).data
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return Favorite.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return get_relations(request).has(FAVORITES, obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return get_relations(request).has(CART, obj.pk)
+
+
+class CookableRecipeSerializer(RecipeSerialiser):
+    """Serializer for recipes matched by ingredients on hand."""
+
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerialiser.Meta):
+        fields = RecipeSerialiser.Meta.fields + ('missing_ingredients',)
 
 
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
     """Serializer for add ingredient in recipe. """
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -152,9 +179,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
     author = UsersManageSerializer(read_only=True)
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all())
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     image = Base64ImageField(max_length=1000)
 
     class Meta:
@@ -170,20 +195,37 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         ]
 
-    def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        _list_of_ingridients = []
+    def validate_ingredients(self, ingredients):
+        """
+        Resolve all ids with one query, unknown ones are reported
+        per item like PrimaryKeyRelatedField does.
+        """
+        found = Ingredient.objects.in_bulk({i['id'] for i in ingredients})
+        if any(i['id'] not in found for i in ingredients):
+            message = PrimaryKeyListField.default_error_messages[
+                'does_not_exist'
+            ]
+            raise serializers.ValidationError([
+                {'id': [message.format(pk_value=i['id'])]}
+                if i['id'] not in found else {}
+                for i in ingredients
+            ])
         for i in ingredients:
-            amount = i['amount']
-            if int(amount) <= 0:
+            i['id'] = found[i['id']]
+        return ingredients
+
+    def validate(self, data):
+        seen = set()
+        for i in data.get('ingredients', ()):
+            if i['amount'] <= 0:
                 raise serializers.ValidationError({
                     'amount': 'Количество ингредиентов должно быть больше 0!'
                 })
-            if i['id'] in _list_of_ingridients:
+            if i['id'].pk in seen:
                 raise serializers.ValidationError({
                     'ingredient': 'Ингредиенты должны быть уникальными!'
                 })
-            _list_of_ingridients.append(i['id'])
+            seen.add(i['id'].pk)
         return data
 
     def create_related_objects(self, recipe, ingredients, tags):
@@ -210,25 +252,85 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(
-            author=request.user,
-            **validated_data
-        )
-        recipe.save()
-        self.create_related_objects(recipe, ingredients, tags)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=request.user,
+                **validated_data
+            )
+            self.create_related_objects(recipe, ingredients, tags)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        current = {
+            item.ingredient_id: item
+            for item in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {i.get('id').id: i.get('amount') for i in ingredients}
+        changed = list()
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(
+                ingredient_id=ingredient_id,
+                recipe=recipe,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+
+    def update_tags(self, recipe, tags):
+        current = set(
+            RecipeTag.objects.filter(
+                recipe=recipe
+            ).values_list('tag_id', flat=True)
+        )
+        new = {tag.id for tag in tags}
+        if current - new:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - new
+            ).delete()
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new - current
+        ])
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        Recipe.objects.filter(pk=instance.id).update(**validated_data)
-        recipe = Recipe.objects.get(id=instance.id)
-        IngredientRecipe.objects.filter(recipe=recipe).delete()
-        RecipeTag.objects.filter(recipe=recipe).delete()
-        self.create_related_objects(recipe, ingredients, tags)
-        return recipe
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if validated_data:
+            for field, value in validated_data.items():
+                setattr(instance, field, value)
+            instance.save(update_fields=list(validated_data))
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        return instance
 
     def to_representation(self, instance):
+        # The ingredients with one query instead of one per ingredient.
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            ),
+            'tags'
+        )
         return RecipeSerialiser(instance, context={
             'request': self.context.get('request')
         }).data
@@ -237,9 +339,11 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 class ShowFavoriteSerializer(serializers.ModelSerializer):
     """Serializer for display favorites recipes."""
 
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
@@ -273,7 +377,6 @@ class ShowSubscriptionsSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -289,26 +392,27 @@ class ShowSubscriptionsSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return Follow.objects.filter(
-            user=request.user, author=obj).exists()
+        return get_relations(request).has(FOLLOWS, obj.pk)
 
     def get_recipes(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        recipes = Recipe.objects.filter(author=obj)
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+            limit = request.query_params.get('recipes_limit')
+            if limit:
+                recipes = recipes[:int(limit)]
         return ShowFavoriteSerializer(
             recipes, many=True, context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     """Serializer for model Follow."""
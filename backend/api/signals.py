@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+from .authentication import forget_tokens, forget_user_tokens
+from .cache import (INGREDIENTS, TAGS, bump_version, invalidate_author,
+                    invalidate_recipe)
+
+# User fields shown as the author of a recipe.
+AUTHOR_FIELDS = {'username', 'email', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version(TAGS)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_version(INGREDIENTS)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipes(instance, **kwargs):
+    invalidate_recipe(instance.pk)
+
+
+def is_login(update_fields):
+    return update_fields is not None and set(update_fields) <= {'last_login'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              **kwargs):
+    # Deleting a user deletes their recipes, which invalidates them.
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    invalidate_author(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    # Password changes, deactivation and profile edits.
+    if is_login(update_fields):
+        return
+    forget_user_tokens([instance])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    # Logout, deleting the user deletes the token too.
+    forget_tokens([instance.key])
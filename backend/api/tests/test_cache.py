@@ -0,0 +1,53 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+
+from .test_queries import RecipeDataTestCase, create_user
+
+
+class RecipeCacheTest(RecipeDataTestCase):
+    '''Anonymous recipe responses are dropped only by their authors.'''
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def usernames(self, url):
+        return {
+            recipe['author']['username']
+            for recipe in self.get(url)[0]['results']
+        }
+
+    def test_other_users(self):
+        self.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_user('newcomer')
+            self.user.first_name = 'Другое'
+            self.user.save()
+        self.assertEqual(self.get('/api/recipes/')[1], 0)
+
+    def test_author(self):
+        self.get('/api/recipes/')
+        self.get(f'/api/recipes/{self.recipe_of(self.authors[0])}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.authors[0].username = 'renamed'
+            self.authors[0].save()
+        self.assertIn('renamed', self.usernames('/api/recipes/'))
+        recipe, _ = self.get(
+            f'/api/recipes/{self.recipe_of(self.authors[0])}/'
+        )
+        self.assertEqual(recipe['author']['username'], 'renamed')
+
+    def recipe_of(self, author):
+        return Recipe.objects.filter(author=author).values_list(
+            'id', flat=True
+        )[0]
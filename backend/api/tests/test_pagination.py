@@ -0,0 +1,48 @@
+from django.core.cache import caches
+from django.test import override_settings
+
+from api.pagination import KeysetPagination, RecipePagination
+from recipes.models import Recipe
+
+from .test_queries import RECIPES, RecipeDataTestCase
+
+
+class KeysetPaginationTest(RecipeDataTestCase):
+    '''Cursor pages follow the requested ordering.'''
+
+    def get(self, url):
+        for cache in caches.all():
+            cache.clear()
+        return self.anonymous.get(url)
+
+    def walk(self, query):
+        cursor = KeysetPagination.cursor_query_param
+        param = RecipePagination.page_size_query_param
+        url = f'/api/recipes/?{param}=3&{cursor}=&{query}'
+        ids = []
+        while url:
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_ordering(self):
+        for fast_reads in (False, True):
+            for ordering in ('-pub_date', 'favorites_count',
+                             '-favorites_count', 'trending_score'):
+                with self.subTest(API_FAST_READS=fast_reads,
+                                  ordering=ordering), \
+                        override_settings(API_FAST_READS=fast_reads):
+                    ids = self.walk(f'ordering={ordering}')
+                    self.assertEqual(len(ids), RECIPES)
+                    self.assertEqual(ids, list(
+                        Recipe.objects.order_by(ordering, '-id')
+                        .values_list('id', flat=True)
+                    ))
+
+    def test_ranking_rejected(self):
+        cursor = KeysetPagination.cursor_query_param
+        response = self.get(f'/api/recipes/?search=Рецепт&{cursor}=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(cursor, response.json())
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.pagination import RecipePagination
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Follow, User
+
+RECIPES = 10
+
+
+def create_user(name):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', password='password',
+        first_name='Имя', last_name='Фамилия'
+    )
+
+
+class RecipeDataTestCase(APITestCase):
+    '''
+    Recipes of a few authors, some favorited and in the cart.
+    Uploaded images go to a temporary MEDIA_ROOT.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.authors = authors = [
+            create_user(f'author{num}') for num in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {num}', color=f'#00000{num}',
+                               slug=f'tag{num}')
+            for num in range(3)
+        ]
+        cls.tags = tags
+        cls.ingredients = ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {num}',
+                                      measurement_unit='г')
+            for num in range(5)
+        ]
+        for num in range(RECIPES):
+            recipe = Recipe.objects.create(
+                author=authors[num % len(authors)], name=f'Рецепт {num}',
+                text='Описание', cooking_time=num + 1,
+                image='recipes/images/recipe.png'
+            )
+            RecipeTag.objects.create(recipe=recipe, tag=tags[num % 3])
+            for ingredient in ingredients[:num % 5 + 1]:
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=num + 1
+                )
+            if num % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if num % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Follow.objects.create(user=cls.user, author=authors[0])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+
+class RecipeListQueriesTest(RecipeDataTestCase):
+    '''A page of recipes costs the same queries whatever its size.'''
+
+    def get_page(self, client, page_size, queries):
+        for cache in caches.all():
+            cache.clear()
+        param = RecipePagination.page_size_query_param
+        with self.assertNumQueries(queries):
+            response = client.get(f'/api/recipes/?{param}={page_size}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.json()['results']), min(page_size, RECIPES)
+        )
+
+    def assert_fixed_queries(self, client, queries):
+        for fast_reads in (False, True):
+            with self.subTest(API_FAST_READS=fast_reads), \
+                    override_settings(API_FAST_READS=fast_reads):
+                for page_size in (6, 100):
+                    self.get_page(client, page_size, queries)
+
+    def test_anonymous(self):
+        # Count, page, tags, ingredients.
+        self.assert_fixed_queries(self.anonymous, 4)
+
+    def test_authenticated(self):
+        # The token too.
+        self.assert_fixed_queries(self.authenticated, 5)
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'Plans on other databases depend on table statistics.')
+class RecipeFilterPlanTest(RecipeDataTestCase):
+    '''RecipeFilter lookups are served by indexes, not table scans.'''
+
+    def get_plan(self, path):
+        '''EXPLAIN QUERY PLAN of the query reading the recipe page.'''
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authenticated.get(path)
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "recipes_recipe"."id"')
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def test_author(self):
+        plan = self.get_plan(f'/api/recipes/?author={self.authors[0].pk}')
+        self.assertIn('USING INDEX recipe_author_pub_date_idx', plan)
+
+    def test_exists_filters(self):
+        tags = '&'.join(f'tags={tag.slug}' for tag in self.tags[:2])
+        for query in (tags, 'is_favorited=1', 'is_in_shopping_cart=1'):
+            with self.subTest(query):
+                plan = self.get_plan(f'/api/recipes/?{query}')
+                self.assertIn('CORRELATED SCALAR SUBQUERY', plan)
+                self.assertNotIn('SCAN U0', plan)
@@ -0,0 +1,44 @@
+from django.core.cache import caches
+from django.test import override_settings
+
+from recipes.models import Recipe
+
+from .test_queries import RecipeDataTestCase
+
+
+class ReaderParityTest(RecipeDataTestCase):
+    '''The .values() readers render the same bytes as the serializers.'''
+
+    def get(self, client, url, fast_reads):
+        for cache in caches.all():
+            cache.clear()
+        with override_settings(API_FAST_READS=fast_reads):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_parity(self, client, urls):
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.get(client, url, True), self.get(client, url, False)
+                )
+
+    def get_urls(self):
+        recipe = Recipe.objects.filter(author=self.authors[0]).first()
+        return [
+            '/api/recipes/?page_size=100',
+            f'/api/recipes/?author={self.authors[0].pk}',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/recipes/?is_favorited=1',
+        ]
+
+    def test_anonymous(self):
+        self.assert_parity(self.anonymous, self.get_urls())
+
+    def test_authenticated(self):
+        # Subscriptions need a user.
+        self.assert_parity(self.authenticated, self.get_urls() + [
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/users/subscriptions/?recipes_limit=3',
+        ])
@@ -0,0 +1,107 @@
+import base64
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from api.field import CHUNK_SIZE
+
+from .test_queries import RecipeDataTestCase
+
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+class RecipeValidationTest(RecipeDataTestCase):
+    '''Invalid ingredients are reported under the keys clients expect.'''
+
+    def post(self, ingredients, tags=None):
+        ingredient = self.ingredients[0].pk
+        response = self.authenticated.post('/api/recipes/', {
+            'ingredients': [
+                {'id': ingredient if pk is None else pk, 'amount': amount}
+                for pk, amount in ingredients
+            ],
+            'tags': tags or [self.tags[0].pk],
+            'image': PIXEL,
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        return response.json()
+
+    def test_amount(self):
+        self.assertIn('amount', self.post([(None, 0)]))
+
+    def test_duplicate(self):
+        self.assertIn('ingredient', self.post([(None, 1), (None, 2)]))
+
+    def test_unknown(self):
+        errors = self.post([(None, 1), (0, 1)])['ingredients']
+        self.assertEqual(errors[0], {})
+        self.assertIn('id', errors[1])
+
+    def test_unknown_tags(self):
+        errors = self.post([(None, 1)], tags=[self.tags[0].pk, 0, -1])
+        self.assertEqual(len(errors['tags']), 2)
+
+
+class RecipeImageTest(RecipeDataTestCase):
+    '''Images come as data URLs, wrapped base64 included.'''
+
+    def test_wrapped_base64(self):
+        # Noise does not compress: the encoded image spans several chunks.
+        side = 200
+        content = BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+            content, 'PNG'
+        )
+        encoded = base64.encodebytes(content.getvalue()).decode()
+        self.assertGreater(len(encoded), 2 * CHUNK_SIZE)
+        response = self.authenticated.post('/api/recipes/', {
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+            'tags': [self.tags[0].pk],
+            'image': f'data:image/png;base64,{encoded}',
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class RecipeWriteQueriesTest(RecipeDataTestCase):
+    '''Saving a recipe costs the same queries whatever its ingredients.'''
+
+    QUERIES = 14
+
+    def get_data(self, count, amount):
+        return {
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient in self.ingredients[:count]
+            ],
+            'tags': [self.tags[0].pk],
+            'image': PIXEL,
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 1,
+        }
+
+    def test_create_and_update(self):
+        for count in (1, len(self.ingredients)):
+            with self.subTest(ingredients=count):
+                with self.assertNumQueries(self.QUERIES):
+                    response = self.authenticated.post(
+                        '/api/recipes/', self.get_data(count, 1),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                url = f'/api/recipes/{response.json()["id"]}/'
+                with self.assertNumQueries(self.QUERIES):
+                    response = self.authenticated.patch(
+                        url, self.get_data(count, 2), format='json'
+                    )
+                self.assertEqual(response.status_code, 200)
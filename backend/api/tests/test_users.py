@@ -0,0 +1,61 @@
+from django.core.cache import caches
+from django.test import override_settings
+
+from api.authentication import forget_user_tokens
+from users.models import Follow, User
+
+from .test_queries import RecipeDataTestCase, create_user
+
+
+class UserFieldsTest(RecipeDataTestCase):
+    '''Users are shown without the password hash.'''
+
+    def get(self, url):
+        for cache in caches.all():
+            cache.clear()
+        response = self.authenticated.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_no_password(self):
+        for fast_reads in (False, True):
+            with self.subTest(API_FAST_READS=fast_reads), \
+                    override_settings(API_FAST_READS=fast_reads):
+                recipes = self.get('/api/recipes/')['results']
+                users = self.get('/api/users/')['results']
+                for user in [recipe['author'] for recipe in recipes] + [
+                    *users, self.get('/api/users/me/')
+                ]:
+                    self.assertNotIn('password', user)
+
+
+class TokenCacheTest(RecipeDataTestCase):
+    '''Deactivated users lose access despite the cached token.'''
+
+    def get_me(self):
+        return self.authenticated.get('/api/users/me/').status_code
+
+    def test_save(self):
+        self.assertEqual(self.get_me(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get_me(), 401)
+
+    def test_update(self):
+        self.assertEqual(self.get_me(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            forget_user_tokens([self.user])
+        self.assertEqual(self.get_me(), 401)
+
+    def test_set_password_keeps_counters(self):
+        self.assertEqual(self.get_me(), 200)
+        Follow.objects.create(user=create_user('fan'), author=self.user)
+        response = self.authenticated.post('/api/users/set_password/', {
+            'current_password': 'password',
+            'new_password': 'Xq7-new-password',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.followers_count, 1)
@@ -14,6 +14,16 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('tags', TagViewSet, basename='tags')
 
 urlpatterns = [
+    path(
+        'recipes/feed/',
+        RecipeViewSet.as_view({'get': 'feed'}),
+        name='feed'
+    ),
+    path(
+        'recipes/cookable/',
+        RecipeViewSet.as_view({'get': 'cookable'}),
+        name='cookable'
+    ),
     path(
         'recipes/download_shopping_cart/',
         ShoppingCartView.as_view({'get': 'download_list'}),
@@ -1,22 +1,46 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch, Sum,
+                              Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets, mixins
+from rest_framework import filters, status, viewsets, mixins
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from recipes.models import (Favorite, Ingredient, Recipe, IngredientRecipe,
                             ShoppingCart, Tag)
+from recipes import feed
+from recipes.matching import recipe_ingredient_index
+from recipes.search import by_position
+from recipes.signals import reindex_recipes
 from users.models import Follow, User
 
+from .cache import (INGREDIENTS, RECIPES, TAGS, CachedReadMixin,
+                    invalidate_recipe, recipe_namespace)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .pagination import CustomPagination, FeedPagination, RecipePagination
 from .permissions import IsAuthorOrAdminOrReadOnly
-from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeSerialiser,
-                          ShoppingCartSerializer, ShowSubscriptionsSerializer,
-                          SubscriptionSerializer, TagSerializer)
+from .readers import IngredientReader, RecipeReader, RowReadMixin, TagReader
+from .replica import ReplicaReadMixin
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
+from .serializers import (CookableRecipeSerializer, CreateRecipeSerializer,
+                          FavoriteSerializer, IngredientSerializer,
+                          RecipeSerialiser, ShoppingCartSerializer,
+                          ShowSubscriptionsSerializer, SubscriptionSerializer,
+                          TagSerializer)
+
+SHOPPING_LIST_RENDERERS = (
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+)
 
 
 class SubscribeView(mixins.CreateModelMixin,
@@ -33,7 +57,9 @@ class SubscribeView(mixins.CreateModelMixin,
             User,
             pk=self.kwargs.get('author_id'),
         )
-        Follow.objects.create(author=author, user=self.request.user)
+        with transaction.atomic():
+            Follow.objects.create(author=author, user=self.request.user)
+            feed.follow(self.request.user, author)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, serializer, *args, **kwargs):
@@ -41,11 +67,15 @@ class SubscribeView(mixins.CreateModelMixin,
             User,
             pk=self.kwargs.get('author_id'),
         )
-        Follow.objects.filter(author=author, user=self.request.user).delete()
+        with transaction.atomic():
+            Follow.objects.filter(
+                author=author, user=self.request.user
+            ).delete()
+            feed.unfollow(self.request.user, author)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ShowSubscriptionsView(viewsets.ReadOnlyModelViewSet):
+class ShowSubscriptionsView(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Show subscriptions."""
 
     permission_classes = [IsAuthenticated, ]
@@ -53,7 +83,49 @@ class ShowSubscriptionsView(viewsets.ReadOnlyModelViewSet):
     serializer_class = ShowSubscriptionsSerializer
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit', '')
+        return int(limit) if limit.isdigit() else None
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.attach_recipes_preview(page, self.get_recipes_limit())
+        return page
+
+    def attach_recipes_preview(self, authors, limit):
+        """Fetch the latest recipes of all authors in one query."""
+        if not authors:
+            return
+        condition = '' if limit is None else 'WHERE row_number <= %s'
+        recipes = Recipe.objects.raw(
+            f"""
+            SELECT id, author_id, name, image, image_variants, cooking_time
+            FROM (
+                SELECT id, author_id, name, image, image_variants,
+                    cooking_time,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+                    ) AS row_number
+                FROM {Recipe._meta.db_table}
+                WHERE author_id IN ({', '.join(['%s'] * len(authors))})
+            ) AS preview {condition}
+            ORDER BY author_id, row_number
+            """,
+            [author.id for author in authors]
+            + ([] if limit is None else [limit])
+        )
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipes_preview = recipes_by_author[author.id]
 
 
 class FavoriteView(mixins.CreateModelMixin,
@@ -63,19 +135,22 @@ class FavoriteView(mixins.CreateModelMixin,
     """Add & delete recipes."""
 
     permission_classes = [IsAuthenticated, ]
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     serializer_class = FavoriteSerializer
+    cursor_ordering = ('-id', )
 
     def get_queryset(self):
-        recipe = get_object_or_404(Favorite, user=self.request.user)
-        return recipe
+        return Favorite.objects.filter(
+            user=self.request.user
+        ).select_related('recipe')
 
     def create(self, serializer, **kwargs):
         recipe = get_object_or_404(
             Recipe,
             pk=self.kwargs.get('recipe_id')
         )
-        Favorite.objects.create(recipe=recipe, user=self.request.user)
+        with transaction.atomic():
+            Favorite.objects.create(recipe=recipe, user=self.request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, serializer, *args, **kwargs):
@@ -83,48 +158,167 @@ class FavoriteView(mixins.CreateModelMixin,
             Recipe,
             pk=self.kwargs.get('recipe_id')
         )
-        Favorite.objects.filter(recipe=recipe, user=self.request.user).delete()
+        favorite = Favorite.objects.filter(
+            recipe=recipe, user=self.request.user
+        ).first()
+        if favorite is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            favorite.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, CachedReadMixin, RowReadMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """List tags."""
 
+    cache_namespace = TAGS
     permission_classes = [AllowAny, ]
     pagination_class = None
     serializer_class = TagSerializer
+    reader_class = TagReader
     queryset = Tag.objects.all()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, CachedReadMixin, RowReadMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """List ingredients."""
 
+    cache_namespace = INGREDIENTS
     permission_classes = [AllowAny, ]
     pagination_class = None
     serializer_class = IngredientSerializer
+    reader_class = IngredientReader
     queryset = Ingredient.objects.all()
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, CachedReadMixin, RowReadMixin,
+                    viewsets.ModelViewSet):
     """Add & update & delete & list recipes."""
 
     permission_classes = [IsAuthorOrAdminOrReadOnly, ]
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     queryset = Recipe.objects.all()
-    filter_backends = [DjangoFilterBackend, ]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'trending_score')
+    cache_namespace = RECIPES
+    cache_timeout = settings.RECIPE_CACHE_TIMEOUT
+    reader_class = RecipeReader
+
+    def can_cache(self, request):
+        """Responses are the same for every anonymous user."""
+        return request.user.is_anonymous and super().can_cache(request)
+
+    def get_cache_namespaces(self):
+        recipes = RECIPES
+        if self.action == 'retrieve':
+            recipes = recipe_namespace(self.kwargs[self.lookup_field])
+        return [recipes, TAGS, INGREDIENTS]
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
+        user = self.request.user
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            ))
+        )
 
     def get_serializer_class(self):
-        if self.action in SAFE_METHODS:
+        if self.request.method in SAFE_METHODS:
             return RecipeSerialiser
         return CreateRecipeSerializer
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        recipe_id = serializer.instance.pk
+        invalidate_recipe(recipe_id)
+        transaction.on_commit(lambda: reindex_recipes([recipe_id]))
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
 
+    def get_permissions(self):
+        if self.action == 'feed':
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def feed(self, request, **kwargs):
+        """New recipes of the authors the user follows."""
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(
+            self.read_queryset(self.get_queryset()), request, self
+        )
+        return paginator.get_paginated_response(self.represent(page))
+
+    def get_ingredient_ids(self, request):
+        try:
+            ids = {
+                int(pk)
+                for value in request.query_params.getlist('ingredients')
+                for pk in value.split(',') if pk.strip()
+            }
+        except ValueError:
+            ids = None
+        if not ids:
+            raise ValidationError({
+                'ingredients': 'Укажите id ингредиентов через запятую.'
+            })
+        return ids
+
+    def cookable(self, request, **kwargs):
+        """
+        Recipes using the given ingredients: those needing nothing else
+        first, then the ones missing the fewest ingredients.
+        """
+        matches = dict(
+            recipe_ingredient_index.match(self.get_ingredient_ids(request))
+        )
+        queryset = self.get_queryset()
+        if matches:
+            queryset = by_position(queryset, list(matches))
+        else:
+            queryset = queryset.none()
+        page = self.paginate_queryset(self.read_queryset(queryset))
+        if self.use_reader():
+            data = self.represent(page)
+            for recipe in data:
+                recipe['missing_ingredients'] = matches[recipe['id']]
+            return self.get_paginated_response(data)
+        for recipe in page:
+            recipe.missing_ingredients = matches[recipe.pk]
+        serializer = CookableRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
 
 class ShoppingCartView(mixins.CreateModelMixin,
                        mixins.ListModelMixin,
@@ -145,7 +339,8 @@ class ShoppingCartView(mixins.CreateModelMixin,
             Recipe,
             pk=self.kwargs.get('recipe_id')
         )
-        ShoppingCart.objects.create(recipe=recipe, user=self.request.user)
+        with transaction.atomic():
+            ShoppingCart.objects.create(recipe=recipe, user=self.request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, serializer, *args, **kwargs):
@@ -153,28 +348,41 @@ class ShoppingCartView(mixins.CreateModelMixin,
             Recipe,
             pk=self.kwargs.get('recipe_id')
         )
-        ShoppingCart.objects.filter(
+        cart = ShoppingCart.objects.filter(
             recipe=recipe, user=self.request.user
-        ).delete()
+        ).first()
+        if cart is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            cart.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def download_list(self, serializer, **kwargs):
-        ingredient_list = "Cписок покупок:"
+    def get_renderers(self):
+        if getattr(self, 'action', None) == 'download_list':
+            return [renderer() for renderer in SHOPPING_LIST_RENDERERS]
+        return super().get_renderers()
+
+    def handle_exception(self, exc):
+        if getattr(self, 'action', None) == 'download_list':
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def download_list(self, request, **kwargs):
+        renderer = request.accepted_renderer
         ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=self.request.user
+            recipe__shopping_cart__user=request.user
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        for num, i in enumerate(ingredients):
-            ingredient_list += (
-                f"\n{i['ingredient__name']} - "
-                f"{i['amount']} {i['ingredient__measurement_unit']}"
-            )
-            if num < ingredients.count() - 1:
-                ingredient_list += ', '
-        file = 'shopping_list'
-        response = HttpResponse(
-            ingredient_list, 'Content-Type: application/pdf'
+        ).annotate(
+            amount=Sum('amount')
+        ).order_by('ingredient__name')
+        # Rows are read here: under ASGI the response is iterated
+        # on the event loop, where the ORM cannot run.
+        response = StreamingHttpResponse(
+            renderer.stream(list(ingredients)),
+            content_type=renderer.media_type
         )
-        response['Content-Disposition'] = f'attachment; filename="{file}.pdf"'
+        file = f'shopping_list.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{file}"'
         return response
@@ -9,7 +9,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = os.getenv('SECRET_KEY', default='1234567890')
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', default='True') == 'True'
 
 ALLOWED_HOSTS = [
     'backend:8000',
@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replica.PinPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -76,16 +77,22 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
 
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.ORJSONRenderer',
+    ) + (
+        ('rest_framework.renderers.BrowsableAPIRenderer',) if DEBUG else ()
     )
 }
 
+# Connect through pgbouncer in transaction pooling mode:
+# a transaction may get a different server connection each time,
+# so cursors cannot outlive it.
+PGBOUNCER = os.getenv('PGBOUNCER', default='False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('ENGINE', default='django.db.backends.postgresql'),
@@ -93,10 +100,54 @@ DATABASES = {
         'USER': os.getenv('USER', default='postgres'),
         'PASSWORD': os.getenv('PASSWORD', default='postgres'),
         'HOST': os.getenv('HOST', default='db'),
-        'PORT': os.getenv('PORT', default='5432')
+        'PORT': os.getenv('PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': PGBOUNCER,
     }
 }
 
+# A read replica of the primary, e.g. a streaming standby, used by
+# the read endpoints, see recipes/db.py.
+REPLICA_HOST = os.getenv('REPLICA_HOST')
+REPLICA_NAME = os.getenv('REPLICA_NAME')
+if REPLICA_HOST or REPLICA_NAME:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=REPLICA_HOST or DATABASES['default']['HOST'],
+        PORT=os.getenv('REPLICA_PORT', default=DATABASES['default']['PORT']),
+        NAME=REPLICA_NAME or DATABASES['default']['NAME'],
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['recipes.db.PrimaryReplicaRouter']
+# Seconds the reads of a user stay on the primary after they write.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=5))
+
+# default is the shared tier, set CACHE_BACKEND to a shared server
+# (memcached) when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-local',
+        'TIMEOUT': 60,
+    },
+}
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60))
+
+# Read endpoints build responses from .values() rows, see api/readers.py.
+API_FAST_READS = os.getenv('API_FAST_READS', default='True') == 'True'
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -127,6 +178,14 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
+# Seconds the user of a token stays cached, in the shared cache and in
+# the memory of a process. A token deleted on logout still works in
+# the other processes for up to AUTH_TOKEN_LOCAL_TIMEOUT.
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=60)
+)
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', default=5))
+
 LANGUAGE_CODE = 'ru-ru'
 
 TIME_ZONE = 'UTC'
@@ -142,12 +201,43 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 EMPTY = '-'
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+INGREDIENT_SEARCH_INDEX_TTL = 60
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+RECIPE_MATCH_LIMIT = 100
+RECIPE_MATCH_INDEX_TTL = 300
+
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', default=1))
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=1000)
+)
+FEED_BACKFILL_SIZE = 50
+
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=24)
+)
+TRENDING_WEIGHTS = {'favorite': 2.0, 'cart': 1.0}
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+RECIPE_IMAGE_MAX_SIDE = 6000
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
 
 CORS_ORIGIN_WHITELIST = (
     'http://158.160.7.126:3000',
@@ -0,0 +1,31 @@
+'''
+Gunicorn settings, sized from the environment.
+
+GUNICORN_WORKER_CLASS=gthread (default) serves backend.wsgi with
+GUNICORN_THREADS threads per worker, so a slow client or a large
+image upload holds a thread instead of a whole worker.
+GUNICORN_WORKER_CLASS=uvicorn serves backend.asgi with uvicorn
+workers; the hot read endpoints then run as async views.
+'''
+import multiprocessing
+import os
+
+WORKER_CLASSES = {
+    'gthread': ('gthread', 'backend.wsgi:application'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'backend.asgi:application'),
+}
+
+worker_class, wsgi_app = WORKER_CLASSES[
+    os.getenv('GUNICORN_WORKER_CLASS', default='gthread')
+]
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.getenv('GUNICORN_THREADS', default=8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = timeout
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
@@ -31,19 +31,16 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'author', 'favorites']
+    list_display = ['id', 'name', 'author', 'favorites_count']
+    list_select_related = ['author']
     search_fields = ['name', 'author__username']
     list_filter = ['tags']
+    readonly_fields = ['favorites_count', 'in_carts_count']
     empty_value_display = EMPTY
     inlines = (
         IngredientsInLine, TagInLine
     )
 
-    def favorites(self, obj):
-        if Favorite.objects.filter(recipe=obj).exists():
-            return Favorite.objects.filter(recipe=obj).count()
-        return 0
-
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
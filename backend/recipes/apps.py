@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import check_connections
+        from .search import create_search_index, create_trigram_index
+        post_migrate.connect(create_trigram_index, sender=self)
+        post_migrate.connect(create_search_index, sender=self)
+        request_started.connect(check_connections)
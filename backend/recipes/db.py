@@ -0,0 +1,72 @@
+import threading
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+state = threading.local()
+
+
+def check_connections(**kwargs):
+    '''
+    Close reused connections that no longer answer, so the request
+    opens a new one instead of failing. Stands in for the
+    CONN_HEALTH_CHECKS database option, which Django handles itself
+    from 4.1 on.
+    '''
+    if django.VERSION >= (4, 1):
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def has_replica():
+    return REPLICA in settings.DATABASES
+
+
+def read_from_replica(enabled):
+    '''Route the reads of the current thread to the replica or back.'''
+    state.replica = enabled and has_replica()
+
+
+def pin_key(user):
+    return f'db-primary:{user.pk}'
+
+
+def pin_primary(user):
+    '''Keep the reads of user on the primary until the replica catches up.'''
+    if has_replica():
+        cache.set(pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and has_replica() and bool(
+        cache.get(pin_key(user))
+    )
+
+
+class PrimaryReplicaRouter:
+    '''
+    Writes go to the primary, and so do reads unless
+    read_from_replica is on for the current thread.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if getattr(state, 'replica', False):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
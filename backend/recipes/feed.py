@@ -0,0 +1,136 @@
+import heapq
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from users.models import Follow, User
+
+from .models import FeedEntry, Recipe
+from .workers import WorkerPool
+
+BATCH_SIZE = 1000
+
+feed_pool = WorkerPool('recipe-feed', settings.FEED_WORKERS)
+
+
+def fans_out(author):
+    '''Recipes of authors with too many followers are pulled on read.'''
+    return author.followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out(recipe_id):
+    '''Put a new recipe in the feeds of all followers of its author.'''
+    recipe = Recipe.objects.select_related('author').filter(
+        pk=recipe_id
+    ).first()
+    if recipe is None or not fans_out(recipe.author):
+        return
+    followers = Follow.objects.filter(author=recipe.author_id).values_list(
+        'user_id', flat=True
+    )
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user, recipe=recipe, pub_date=recipe.pub_date)
+         for user in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def store_latest(users, author_id):
+    '''Put the latest recipes of an author in the feeds of users.'''
+    recipes = list(Recipe.objects.filter(author=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL_SIZE])
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user, recipe_id=recipe, pub_date=pub_date)
+         for user in users for recipe, pub_date in recipes),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    '''Put the latest recipes of a newly followed author in a feed.'''
+    author = User.objects.filter(pk=author_id).first()
+    if author is None or not fans_out(author):
+        return
+    if not Follow.objects.filter(user=user_id, author=author_id).exists():
+        return
+    store_latest([user_id], author_id)
+
+
+def refill(author_id):
+    '''
+    Store the latest recipes of an author who fans out again in the
+    feeds of all followers, they were pulled on read until now.
+    '''
+    author = User.objects.filter(pk=author_id).first()
+    if author is None or not fans_out(author):
+        return
+    store_latest(
+        Follow.objects.filter(author=author_id).values_list(
+            'user_id', flat=True
+        ),
+        author_id
+    )
+
+
+def publish(recipe):
+    feed_pool.submit_after_commit(fan_out, recipe.pk)
+
+
+def follow(user, author):
+    feed_pool.submit_after_commit(backfill, user.pk, author.pk)
+
+
+def unfollow(user, author):
+    '''author.followers_count is the count before the unfollow.'''
+    FeedEntry.objects.filter(user=user, recipe__author=author).delete()
+    if author.followers_count == settings.FEED_FANOUT_MAX_FOLLOWERS + 1:
+        feed_pool.submit_after_commit(refill, author.pk)
+
+
+def before(position, date_field, id_field):
+    if position is None:
+        return Q()
+    pub_date, pk = position
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(
+        **{date_field: pub_date, f'{id_field}__lt': pk}
+    )
+
+
+def read_feed(user, position, limit):
+    '''
+    Ids of up to limit feed recipes older than position (pub_date, id),
+    newest first. Stored entries are read with a range scan of
+    the (user, pub_date, recipe) index and merged with the recipes of
+    followed authors that are not fanned out. Entries of authors
+    the user no longer follows, left by a job that ran late,
+    are skipped.
+    '''
+    stored = FeedEntry.objects.filter(
+        before(position, 'pub_date', 'recipe_id'),
+        Exists(Follow.objects.filter(
+            user=user, author=OuterRef('recipe__author')
+        )),
+        user=user
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    streams = [list(stored)]
+    pulled = list(Follow.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('author_id', flat=True))
+    if pulled:
+        streams.append(list(Recipe.objects.filter(
+            before(position, 'pub_date', 'id'), author_id__in=pulled
+        ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]))
+    ids, seen = [], set()
+    for _, recipe in heapq.merge(*streams, reverse=True):
+        if recipe not in seen:
+            seen.add(recipe)
+            ids.append(recipe)
+            if len(ids) == limit:
+                break
+    return ids
@@ -0,0 +1,77 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .models import Recipe
+from .workers import WorkerPool
+
+VARIANTS_DIR = 'recipes/variants'
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+image_pool = WorkerPool('recipe-images', settings.RECIPE_IMAGE_WORKERS)
+
+
+def variant_name(variant, extension):
+    '''The storage renames the file by its content hash.'''
+    return f'{VARIANTS_DIR}/{variant}.{extension}'
+
+
+def encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = {'optimize': True}
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = 80
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(source):
+    '''
+    Resize the source image to every size in RECIPE_IMAGE_VARIANTS,
+    each one in the original format and in WebP.
+    '''
+    with default_storage.open(source) as file:
+        original = Image.open(file)
+        original.load()
+    image_format = original.format
+    if image_format not in EXTENSIONS:
+        image_format = 'PNG'
+    if original.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        original = original.convert('RGBA')
+    variants = {'source': source}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        for key, save_format in (
+            (variant, image_format), (f'{variant}_webp', 'WEBP')
+        ):
+            name = variant_name(variant, EXTENSIONS[save_format])
+            variants[key] = default_storage.save(
+                name, encode(image, save_format)
+            )
+    return variants
+
+
+def process_recipe_image(recipe_id, source):
+    '''Store the variants unless the recipe got another image meanwhile.'''
+    variants = render_variants(source)
+    recipe = Recipe.objects.filter(pk=recipe_id, image=source).first()
+    if recipe is not None:
+        recipe.image_variants = variants
+        recipe.save(update_fields=['image_variants'])
+
+
+def schedule_variants(recipe):
+    '''
+    Render the variants of a recipe image in the worker pool
+    once the transaction that saved the recipe is committed.
+    With RECIPE_IMAGE_WORKERS = 0 they are rendered in place.
+    '''
+    image_pool.submit_after_commit(
+        process_recipe_image, recipe.pk, recipe.image.name
+    )
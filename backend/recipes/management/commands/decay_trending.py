@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import decay_scores, recompute_scores
+
+
+class Command(BaseCommand):
+    '''
+    Age the trending scores by the time since the previous run,
+    run it periodically, e.g. hourly.
+    '''
+
+    help = 'Decay recipe trending scores or recompute them from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recompute', action='store_true',
+            help='Rebuild the scores from favorites and shopping carts.'
+        )
+
+    def handle(self, *args, **options):
+        if options['recompute']:
+            recipes = recompute_scores()
+            self.stdout.write(self.style.SUCCESS(
+                f'Trending scores recomputed for {recipes} recipes'
+            ))
+            return
+        hours, zeroed = decay_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Trending scores decayed by {hours:.3f}h, '
+            f'{zeroed} dropped to zero'
+        ))
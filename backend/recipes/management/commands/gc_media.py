@@ -0,0 +1,70 @@
+import posixpath
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import VARIANTS_DIR
+from recipes.models import Recipe
+
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to
+
+
+def walk(storage, directory):
+    '''Names of all files under directory in the storage.'''
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    '''Delete recipe images and variants no recipe refers to.'''
+
+    help = 'Remove unreferenced recipe images from the media storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Keep files younger than this many seconds, they may '
+                 'belong to a recipe that is being saved.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the files that would be deleted.'
+        )
+
+    def referenced(self):
+        names = set()
+        for image, variants in Recipe.objects.exclude(image='').values_list(
+            'image', 'image_variants'
+        ).iterator():
+            names.add(image)
+            names.update(variants.values())
+        return names
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        deadline = time.time() - options['min_age']
+        referenced = self.referenced()
+        removed = freed = 0
+        for directory in (IMAGES_DIR, VARIANTS_DIR):
+            for name in walk(storage, directory):
+                if name in referenced:
+                    continue
+                if storage.get_modified_time(name).timestamp() > deadline:
+                    continue
+                size = storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+                removed += 1
+                freed += size
+        action = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {removed} files, {freed / 1024:.1f} KB'
+        ))
@@ -0,0 +1,140 @@
+import random
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            RecipeTag, ShoppingCart, Tag)
+from recipes.search import update_search_index
+from users.models import Follow, User
+
+PASSWORD = 'foodgram-benchmark'
+
+
+class Command(BaseCommand):
+    '''Fill the database with generated users, recipes and relations.'''
+
+    help = 'Generate users, recipes, follows, favorites and carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX')
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=int, nargs=2, default=(1, 3),
+            metavar=('MIN', 'MAX')
+        )
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed, the same seed gives the same data.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if not Ingredient.objects.exists() or not Tag.objects.exists():
+            call_command('load_db', stdout=self.stdout)
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(users, options)
+            self.create_relations(users, recipes, options)
+        call_command('sync_counters', stdout=self.stdout)
+        call_command('decay_trending', recompute=True, stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        update_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users and {len(recipes)} recipes '
+            f'in {perf_counter() - started:.3f}s'
+        ))
+
+    def sample(self, population, bounds):
+        low, high = bounds
+        size = self.random.randint(low, high) if high > low else low
+        return self.random.sample(population, min(size, len(population)))
+
+    def create_users(self, count):
+        offset = User.objects.count()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (User(
+                username=f'user{offset + num}',
+                email=f'user{offset + num}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            ) for num in range(count)),
+            batch_size=self.batch_size
+        )
+        return list(User.objects.order_by('-id')[:count])
+
+    def create_recipes(self, users, options):
+        Recipe.objects.bulk_create(
+            (Recipe(
+                author=self.random.choice(users),
+                name=f'Рецепт {num}',
+                text='Описание рецепта. ' * self.random.randint(1, 20),
+                cooking_time=self.random.randint(5, 180),
+            ) for num in range(options['recipes'])),
+            batch_size=self.batch_size
+        )
+        recipes = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+            [:options['recipes']]
+        )
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        tags = list(Tag.objects.values_list('id', flat=True))
+        IngredientRecipe.objects.bulk_create(
+            (IngredientRecipe(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=self.random.randint(1, 500),
+            ) for recipe in recipes
+                for ingredient in self.sample(
+                    ingredients, options['ingredients_per_recipe'])),
+            batch_size=self.batch_size
+        )
+        RecipeTag.objects.bulk_create(
+            (RecipeTag(recipe_id=recipe, tag_id=tag)
+             for recipe in recipes
+             for tag in self.sample(tags, options['tags_per_recipe'])),
+            batch_size=self.batch_size
+        )
+        return recipes
+
+    def create_relations(self, users, recipes, options):
+        user_ids = [user.id for user in users]
+        follows, favorites, carts = [], [], []
+        for user in user_ids:
+            others = [other for other in user_ids if other != user]
+            follows += [
+                Follow(user_id=user, author_id=author)
+                for author in self.sample(
+                    others, (options['follows_per_user'],) * 2)
+            ]
+            favorites += [
+                Favorite(user_id=user, recipe_id=recipe)
+                for recipe in self.sample(
+                    recipes, (options['favorites_per_user'],) * 2)
+            ]
+            carts += [
+                ShoppingCart(user_id=user, recipe_id=recipe)
+                for recipe in self.sample(
+                    recipes, (options['cart_per_user'],) * 2)
+            ]
+        for model, objects in (
+            (Follow, follows), (Favorite, favorites), (ShoppingCart, carts)
+        ):
+            model.objects.bulk_create(
+                objects, batch_size=self.batch_size, ignore_conflicts=True
+            )
@@ -1,28 +1,165 @@
 import csv
-from django.core.management.base import BaseCommand
+import io
+import json
+import os
+from itertools import islice
+from time import perf_counter
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import INGREDIENTS, TAGS, bump_version
 from recipes.models import Ingredient, Tag
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def read_rows(path, fields):
+    '''Yield tuples from a csv file or a json list of objects.'''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path, encoding='utf-8') as file:
+            for item in json.load(file):
+                yield tuple(item[field] for field in fields)
+    elif extension == '.csv':
+        with open(path, encoding='utf-8', newline='') as file:
+            for row in csv.reader(file, delimiter=','):
+                if row:
+                    yield tuple(row[:len(fields)])
+    else:
+        raise CommandError(f'Unsupported file format: {path}')
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
 
 class Command(BaseCommand):
     '''This is a class for import data from csv file to database.'''
 
+    help = 'Load ingredients and tags from csv or json files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(DATA_DIR, 'ingredients.csv'),
+            help='Path to ingredients.csv or ingredients.json.'
+        )
+        parser.add_argument(
+            '--tags',
+            default=os.path.join(DATA_DIR, 'tags.csv'),
+            help='Path to tags.csv.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows per INSERT statement.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count new rows without writing them.'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Use bulk_create even on PostgreSQL.'
+        )
+
     def handle(self, *args, **options):
-        with open(
-            'recipes/management/commands/data/ingredients.csv', 'r'
-        ) as file:
-            data = csv.reader(file, delimiter=',')
-            for row in data:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        started = perf_counter()
+        with transaction.atomic():
+            self.load_ingredients(options)
+            self.load_tags(options)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        if not options['dry_run']:
+            bump_version(INGREDIENTS)
+            bump_version(TAGS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Data imported successfully in {perf_counter() - started:.3f}s'
+        ))
+
+    def new_ingredients(self, path):
+        '''Unique (name, measurement_unit) pairs missing in the database.'''
+        seen = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        for row in read_rows(path, ('name', 'measurement_unit')):
+            if row not in seen:
+                seen.add(row)
+                yield row
+
+    def load_ingredients(self, options):
+        started = perf_counter()
+        rows = self.new_ingredients(options['ingredients'])
+        if options['dry_run']:
+            created = sum(1 for _ in rows)
+        elif connection.vendor == 'postgresql' and not options['no_copy']:
+            created = self.copy_ingredients(rows)
+        else:
+            created = 0
+            for batch in batches(rows, options['batch_size']):
+                Ingredient.objects.bulk_create(
+                    (Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in batch),
+                    ignore_conflicts=True
                 )
-        with open('recipes/management/commands/data/tags.csv', 'r') as file:
-                data = csv.reader(file, delimiter=',')
-                for row in data:
-                    Tag.objects.get_or_create(
-                        name=row[0],
-                        color=row[1],
-                        slug=row[2]
-                    )
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+                created += len(batch)
+        self.report('Ingredients', created, started, options['dry_run'])
+
+    def copy_ingredients(self, rows):
+        '''Stream rows with COPY into a temp table and upsert from it.'''
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(250), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
+
+    def load_tags(self, options):
+        started = perf_counter()
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        tags = [
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in read_rows(
+                options['tags'], ('name', 'color', 'slug')
+            )
+            if slug not in existing
+        ]
+        if not options['dry_run']:
+            Tag.objects.bulk_create(
+                tags,
+                batch_size=options['batch_size'],
+                ignore_conflicts=True
+            )
+        self.report('Tags', len(tags), started, options['dry_run'])
+
+    def report(self, label, created, started, dry_run):
+        action = 'would be created' if dry_run else 'created'
+        self.stdout.write(
+            f'{label}: {created} {action} '
+            f'in {perf_counter() - started:.3f}s'
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import backfill
+from recipes.models import FeedEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    '''Fill every feed from scratch with the recipes of followed authors.'''
+
+    help = 'Rebuild the recipe feeds of all users.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            follows = Follow.objects.values_list('user_id', 'author_id')
+            for user, author in follows.iterator():
+                backfill(user, author)
+        self.stdout.write(self.style.SUCCESS(
+            f'Feeds rebuilt with {FeedEntry.objects.count()} entries'
+        ))
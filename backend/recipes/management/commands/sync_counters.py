@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def count_of(model, field):
+    '''Correlated subquery counting model rows pointing at the outer row.'''
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    '''Recalculate the denormalized counters on recipes and users.'''
+
+    help = 'Recalculate favorites, cart, follower and recipe counters.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_of(Favorite, 'recipe'),
+                in_carts_count=count_of(ShoppingCart, 'recipe')
+            )
+            users = User.objects.update(
+                followers_count=count_of(Follow, 'author'),
+                recipes_count=count_of(Recipe, 'author')
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Counters synced for {recipes} recipes and {users} users'
+        ))
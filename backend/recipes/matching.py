@@ -0,0 +1,156 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import IngredientRecipe
+
+VERSION_KEY = 'version:recipe-matching'
+
+
+def discard(recipes, recipe):
+    position = bisect_left(recipes, recipe)
+    if position < len(recipes) and recipes[position] == recipe:
+        del recipes[position]
+
+
+class RecipeIngredientIndex:
+    '''
+    Inverted index from ingredient ids to sorted arrays of recipe ids,
+    with the number of ingredients of every recipe.
+    Finds recipes covered by a set of ingredients without grouping
+    the whole IngredientRecipe table.
+    Every process holds its own copy. A change bumps a version in the
+    shared cache, and the other processes rebuild when they see it.
+    '''
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.built_at = None
+        self.version = None
+        self.postings = {}
+        self.ingredients = {}
+
+    def shared_version(self):
+        cache = caches['default']
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def bump_version(self):
+        '''
+        Make the other processes rebuild. This one stays current
+        if no other change came in since its build.
+        '''
+        cache = caches['default']
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            version = cache.incr(VERSION_KEY)
+        if self.version == version - 1:
+            self.version = version
+
+    def invalidate(self):
+        self.built_at = None
+        self.bump_version()
+
+    def build(self):
+        postings, ingredients = {}, {}
+        # Read first, a change made during the build triggers another.
+        version = self.shared_version()
+        # Shared by all requests, so read from the primary.
+        rows = IngredientRecipe.objects.using(DEFAULT_DB_ALIAS).order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient, recipe in rows.iterator():
+            postings.setdefault(ingredient, array('q')).append(recipe)
+            ingredients.setdefault(recipe, set()).add(ingredient)
+        self.postings, self.ingredients = postings, ingredients
+        self.version = version
+        self.built_at = monotonic()
+
+    def ensure_built(self):
+        '''
+        Build on first use, then rebuild when another process changed
+        the index or once the TTL is over.
+        While one thread rebuilds, the others keep using the old index.
+        '''
+        if self.built_at is None:
+            with self.lock:
+                if self.built_at is None:
+                    self.build()
+        elif (self.shared_version() != self.version
+              or monotonic() - self.built_at > self.ttl):
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.build()
+                finally:
+                    self.lock.release()
+
+    def remove(self, recipe_id):
+        with self.lock:
+            for ingredient in self.ingredients.pop(recipe_id, ()):
+                discard(self.postings[ingredient], recipe_id)
+            self.bump_version()
+
+    def refresh(self, recipe_ids):
+        '''Reload the ingredients of the given recipes only.'''
+        if self.built_at is None:
+            self.bump_version()
+            return
+        current = {}
+        rows = IngredientRecipe.objects.using(DEFAULT_DB_ALIAS).filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe, ingredient in rows:
+            current.setdefault(recipe, set()).add(ingredient)
+        with self.lock:
+            for recipe in recipe_ids:
+                old = self.ingredients.get(recipe, set())
+                new = current.get(recipe, set())
+                for ingredient in old - new:
+                    discard(self.postings[ingredient], recipe)
+                for ingredient in new - old:
+                    insort(
+                        self.postings.setdefault(ingredient, array('q')),
+                        recipe
+                    )
+                if new:
+                    self.ingredients[recipe] = new
+                else:
+                    self.ingredients.pop(recipe, None)
+            self.bump_version()
+
+    def match(self, ingredient_ids, limit=None):
+        '''
+        (recipe id, missing ingredients) for recipes using at least one
+        of ingredient_ids: cookable ones first, then by fewest missing,
+        more matched ingredients and newer recipes first among equals.
+        '''
+        self.ensure_built()
+        limit = limit or settings.RECIPE_MATCH_LIMIT
+        postings, ingredients = self.postings, self.ingredients
+        hits = {}
+        for ingredient in set(ingredient_ids):
+            for recipe in postings.get(ingredient, ()):
+                hits[recipe] = hits.get(recipe, 0) + 1
+        best = heapq.nsmallest(
+            limit,
+            ((len(ingredients.get(recipe, ())) - count, -count, -recipe)
+             for recipe, count in hits.items())
+        )
+        return [(-recipe, max(missing, 0)) for missing, _, recipe in best]
+
+
+recipe_ingredient_index = RecipeIngredientIndex(
+    settings.RECIPE_MATCH_INDEX_TTL
+)
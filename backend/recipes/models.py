@@ -1,7 +1,9 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -95,11 +97,54 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        'Размеры фото',
+        default=dict,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -128,6 +173,12 @@ class IngredientRecipe(models.Model):
                 name='recipe_ingredient_unique'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='ingredient_recipe_idx'
+            ),
+        )
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
 
@@ -146,6 +197,11 @@ class Favorite(models.Model):
         related_name='favorite_recipe',
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('user',)
@@ -157,6 +213,12 @@ class Favorite(models.Model):
                 name='recipe_favorites_unique',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx'
+            ),
+        )
 
         def __str__(self):
             return f'{self.recipe} в избранном у {self.user}'
@@ -181,6 +243,12 @@ class RecipeTag(models.Model):
                 name='recipe_tag_unique'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='recipe_tag_tag_recipe_idx'
+            ),
+        )
 
         def __str__(self):
             return f'{self.tag} в рецепте {self.recipe}'
@@ -197,6 +265,11 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_cart'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт в списке покупок'
@@ -207,6 +280,64 @@ class ShoppingCart(models.Model):
                 name='recipe_shopping_cart_unique',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='shopping_cart_recipe_user_idx'
+            ),
+        )
 
         def __str__(self):
             return f'{self.recipe} в списке покупок {self.user}'
+
+
+class FeedEntry(models.Model):
+    '''
+    A recipe in the feed of a follower of its author,
+    written when the recipe is published or the author is followed.
+    '''
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='feed_entry_unique',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class TrendingDecay(models.Model):
+    '''
+    The one row holding the time trending scores were last aged to,
+    so decay_trending ages them by the real time since then.
+    '''
+    decayed_at = models.DateTimeField('Время последнего затухания')
+
+    class Meta:
+        verbose_name = 'Затухание популярности'
+        verbose_name_plural = 'Затухание популярности'
+
+    def __str__(self):
+        return f'Оценки состарены на {self.decayed_at}'
@@ -0,0 +1,270 @@
+import re
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredient, IngredientRecipe, Recipe
+
+TRIGRAM_INDEX_NAME = 'recipes_ingredient_name_trgm'
+SEARCH_INDEX_NAME = 'recipes_recipe_search_vector'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def trigrams(text):
+    return grams(text, 3)
+
+
+class IngredientIndex:
+    '''
+    In-process ingredient name index for databases without pg_trgm.
+    Names are kept sorted for prefix lookups with bisect and
+    split into trigrams for substring lookups. Queries shorter
+    than a trigram read the sorted positions of the names
+    containing their one or two letters.
+    '''
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.built_at = None
+        self.names = []
+        self.trigrams = {}
+        self.short_grams = {}
+
+    def invalidate(self):
+        self.built_at = None
+
+    def build(self):
+        # Shared by all requests, so read from the primary.
+        ingredients = Ingredient.objects.using(DEFAULT_DB_ALIAS)
+        names = sorted(
+            (name.casefold(), pk)
+            for pk, name in ingredients.values_list('pk', 'name')
+        )
+        index, short = {}, {}
+        for position, (name, _) in enumerate(names):
+            for trigram in trigrams(name):
+                index.setdefault(trigram, set()).add(position)
+            for gram in grams(name, 1) | grams(name, 2):
+                short.setdefault(gram, []).append(position)
+        self.names, self.trigrams, self.short_grams = names, index, short
+        self.built_at = monotonic()
+
+    def ensure_built(self):
+        if self.built_at is None or monotonic() - self.built_at > self.ttl:
+            with self.lock:
+                if (self.built_at is None
+                        or monotonic() - self.built_at > self.ttl):
+                    self.build()
+
+    def search(self, query, limit):
+        '''Ids of names starting with query, then of names containing it.'''
+        self.ensure_built()
+        names = self.names
+        query = query.casefold()
+        found = []
+        start = bisect_left(names, (query,))
+        for name, pk in names[start:start + limit]:
+            if not name.startswith(query):
+                break
+            found.append(pk)
+        if len(found) >= limit:
+            return found
+        if len(query) < 3:
+            candidates = self.short_grams.get(query, ())
+        else:
+            sets = sorted(
+                (self.trigrams.get(trigram, set())
+                 for trigram in trigrams(query)),
+                key=len
+            )
+            candidates = sorted(set.intersection(*sets))
+        for position in candidates:
+            name, pk = names[position]
+            if query in name and not name.startswith(query):
+                found.append(pk)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+ingredient_index = IngredientIndex(settings.INGREDIENT_SEARCH_INDEX_TTL)
+
+
+def search_ingredients(queryset, query, limit=None):
+    '''
+    Ingredients whose name starts with query come first,
+    then the ones containing it, at most limit results.
+    '''
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    if connection.vendor == 'postgresql':
+        return queryset.filter(name__icontains=query).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('rank', 'name')[:limit]
+    ids = ingredient_index.search(query, limit)
+    if not ids:
+        return queryset.none()
+    return by_position(queryset, ids)
+
+
+def create_trigram_index(using, **kwargs):
+    '''Trigram GIN index used by icontains/istartswith on PostgreSQL.'''
+    if connections[using].vendor != 'postgresql':
+        return
+    table = Ingredient._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX_NAME} ON {table} '
+            'USING gin (UPPER(name::text) gin_trgm_ops)'
+        )
+
+
+def by_position(queryset, ids):
+    '''Rows of ids ordered as in the list.'''
+    return queryset.filter(pk__in=ids).order_by(
+        Case(
+            *[When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)],
+            output_field=IntegerField()
+        )
+    )
+
+
+def fts_query(query):
+    '''Every word of the query as a prefix, words joined with AND.'''
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    '''
+    Recipes matching query in the name, the ingredient names or the text,
+    the best matches first.
+    '''
+    if connection.vendor == 'postgresql':
+        search = SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.filter(search_vector=search).annotate(
+            rank=SearchRank(F('search_vector'), search)
+        ).order_by('-rank', '-pub_date', '-id')
+    match = fts_query(query)
+    if not match:
+        return queryset.none()
+    # Matching and ranking stay in the query, so the other filters,
+    # the count and the page apply to all matches.
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+    )).annotate(search_rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}, 10.0, 5.0, 1.0) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s '
+        f'AND rowid = {Recipe._meta.db_table}.id', [match]
+    )).order_by('search_rank', '-pub_date', '-id')
+
+
+def ingredients_sql(aggregate):
+    return (
+        f'SELECT {aggregate} '
+        f'FROM {IngredientRecipe._meta.db_table} AS amount '
+        f'JOIN {Ingredient._meta.db_table} AS ingredient '
+        'ON ingredient.id = amount.ingredient_id '
+        f'WHERE amount.recipe_id = {Recipe._meta.db_table}.id'
+    )
+
+
+def update_search_index(recipe_ids=None, using='default'):
+    '''
+    Rebuild the search data of the given recipes, of all recipes when
+    recipe_ids is None: the weighted search_vector column on PostgreSQL
+    (name A, ingredients B, text C), the FTS5 table on SQLite.
+    '''
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    vendor = connections[using].vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+    table = Recipe._meta.db_table
+    where, params = '', []
+    if recipe_ids is not None:
+        where = f'WHERE {table}.id IN ({", ".join(["%s"] * len(recipe_ids))})'
+        params = recipe_ids
+    with connections[using].cursor() as cursor:
+        if vendor == 'postgresql':
+            ingredients = ingredients_sql("string_agg(ingredient.name, ' ')")
+            cursor.execute(
+                f'''
+                UPDATE {table} SET search_vector =
+                    setweight(to_tsvector(%s::regconfig, {table}.name), 'A')
+                    || setweight(to_tsvector(%s::regconfig,
+                        coalesce(({ingredients}), '')), 'B')
+                    || setweight(to_tsvector(%s::regconfig, {table}.text), 'C')
+                {where}
+                ''',
+                [settings.RECIPE_SEARCH_CONFIG] * 3 + params
+            )
+            return
+        ingredients = ingredients_sql("group_concat(ingredient.name, ' ')")
+        fts_where = where.replace(f'{table}.id', 'rowid')
+        cursor.execute(f'DELETE FROM {FTS_TABLE} {fts_where}', params)
+        cursor.execute(
+            f'''
+            INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+            SELECT {table}.id, {table}.name,
+                coalesce(({ingredients}), ''), {table}.text
+            FROM {table} {where}
+            ''',
+            params
+        )
+
+
+def remove_from_search_index(recipe_id, using='default'):
+    if connections[using].vendor == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def create_search_index(using, **kwargs):
+    '''
+    GIN index on search_vector on PostgreSQL, FTS5 table on SQLite.
+    Recipes saved before the index existed are indexed here.
+    '''
+    vendor = connections[using].vendor
+    with connections[using].cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} '
+                f'ON {Recipe._meta.db_table} USING gin (search_vector)'
+            )
+            if Recipe.objects.using(using).filter(
+                search_vector__isnull=True
+            ).exists():
+                update_search_index(using=using)
+        elif vendor == 'sqlite':
+            tables = connections[using].introspection.table_names(cursor)
+            if FTS_TABLE in tables:
+                return
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                "name, ingredients, text, tokenize='unicode61')"
+            )
+            update_search_index(using=using)
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Follow, User
+
+from . import trending
+from .feed import publish
+from .images import schedule_variants
+from .matching import recipe_ingredient_index
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart)
+from .search import (ingredient_index, remove_from_search_index,
+                     update_search_index)
+
+# Row model: (model holding the counter, foreign key, counter field,
+# trending weight kind or None).
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count', trending.FAVORITE),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count', trending.CART),
+    Follow: (User, 'author_id', 'followers_count', None),
+    Recipe: (User, 'author_id', 'recipes_count', None),
+}
+
+
+def reindex_recipes(recipe_ids):
+    '''Update the search and matching indexes of changed recipes.'''
+    update_search_index(recipe_ids)
+    recipe_ingredient_index.refresh(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Ingredient)
+def invalidate_matching_index(**kwargs):
+    recipe_ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def render_image_variants(instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if (instance.image
+            and instance.image.name != instance.image_variants.get('source')):
+        schedule_variants(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, update_fields=None, **kwargs):
+    '''
+    After commit, when the ingredients of a new recipe are saved too.
+    Partial saves come from the API, which reindexes the recipe itself.
+    '''
+    if update_fields is None:
+        transaction.on_commit(lambda: reindex_recipes([instance.pk]))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    remove_from_search_index(instance.pk)
+    recipe_ingredient_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if created:
+        return
+    update_search_index(IngredientRecipe.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def publish_recipe(instance, created, **kwargs):
+    if created:
+        publish(instance)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Recipe)
+def count_row(sender, instance, created, **kwargs):
+    '''
+    Counters follow the rows however they are written: the API,
+    the admin or the ORM. bulk_create skips signals,
+    run sync_counters after it.
+    '''
+    if not created:
+        return
+    model, key, counter, kind = COUNTERS[sender]
+    changes = {counter: F(counter) + 1}
+    if kind is not None:
+        changes['trending_score'] = trending.score_added(kind)
+    model.objects.filter(pk=getattr(instance, key)).update(**changes)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Recipe)
+def uncount_row(sender, instance, **kwargs):
+    '''
+    Cascade deletes included. Counters stop at zero,
+    rows counted by nothing must not break the delete.
+    '''
+    model, key, counter, kind = COUNTERS[sender]
+    changes = {counter: Greatest(F(counter) - 1, Value(0))}
+    if kind is not None:
+        changes['trending_score'] = trending.score_removed(
+            kind, instance.created
+        )
+    model.objects.filter(pk=getattr(instance, key)).update(**changes)
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart, TrendingDecay
+
+FAVORITE = 'favorite'
+CART = 'cart'
+EPOCH_SQL = {
+    'postgresql': 'EXTRACT(EPOCH FROM {})',
+    'sqlite': "CAST(strftime('%%s', {}) AS REAL)",
+}
+MIN_SCORE = 1e-3
+
+
+def decay_factor(hours):
+    return 0.5 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+
+
+def score_added(kind):
+    '''New favorites and cart rows count with their full weight.'''
+    return F('trending_score') + settings.TRENDING_WEIGHTS[kind]
+
+
+def score_removed(kind, created):
+    '''Take back the weight of a row as decayed since it was added.'''
+    hours = (timezone.now() - created).total_seconds() / 3600
+    weight = settings.TRENDING_WEIGHTS[kind] * decay_factor(max(hours, 0))
+    return Greatest(F('trending_score') - weight, Value(0.0))
+
+
+def mark_decayed(now):
+    TrendingDecay.objects.update_or_create(
+        pk=1, defaults={'decayed_at': now}
+    )
+
+
+@transaction.atomic
+def decay_scores():
+    '''
+    Age every score by the time since the previous decay, however
+    often it runs. The first run only starts the clock.
+    Returns the hours aged by and the scores dropped to zero.
+    '''
+    now = timezone.now()
+    state = TrendingDecay.objects.select_for_update().filter(pk=1).first()
+    mark_decayed(now)
+    if state is None:
+        return 0, 0
+    hours = max((now - state.decayed_at).total_seconds() / 3600, 0)
+    Recipe.objects.filter(trending_score__gt=0).update(
+        trending_score=F('trending_score') * decay_factor(hours)
+    )
+    return hours, Recipe.objects.filter(
+        trending_score__gt=0, trending_score__lt=MIN_SCORE
+    ).update(trending_score=0)
+
+
+@transaction.atomic
+def recompute_scores(using='default'):
+    '''
+    Sum of the weights of all favorites and cart rows of every recipe,
+    each decayed by its age, in one UPDATE.
+    '''
+    connection = connections[using]
+    epoch = EPOCH_SQL[connection.vendor]
+    table = Recipe._meta.db_table
+    parts, params = [], []
+    now = timezone.now()
+    mark_decayed(now)
+    now = now.timestamp()
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    for kind, model in ((FAVORITE, Favorite), (CART, ShoppingCart)):
+        parts.append(
+            'coalesce((SELECT SUM(%s * POWER(0.5, (%s - {}) / %s)) '
+            'FROM {} AS item WHERE item.recipe_id = {}.id), 0)'.format(
+                epoch.format('item.created'), model._meta.db_table, table
+            )
+        )
+        params += [settings.TRENDING_WEIGHTS[kind], now, half_life]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET trending_score = {" + ".join(parts)}',
+            params
+        )
+        return cursor.rowcount
@@ -0,0 +1,92 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.db import close_old_connections, transaction
+
+from .db import check_connections
+
+logger = logging.getLogger(__name__)
+
+pools = []
+
+
+class WorkerPool:
+    '''
+    Thread pool for work that should not hold up the response.
+    Jobs start once the current transaction is committed;
+    with max_workers = 0 they run right after the commit instead,
+    and while held they wait for run_held().
+    Database connections are kept or closed around every job
+    as around a request, following CONN_MAX_AGE. A failing job
+    is logged and never reaches the request that submitted it.
+    '''
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self.lock = Lock()
+        self.executor = None
+        self.held = None
+        pools.append(self)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name
+                )
+            return self.executor
+
+    def run(self, func, *args):
+        close_old_connections()
+        check_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    def job(self, func, *args):
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('%s job %s%r failed', self.name,
+                             func.__qualname__, args)
+
+    def submit_after_commit(self, func, *args):
+        if self.held is not None:
+            transaction.on_commit(lambda: self.held.append((func, args)))
+            return
+        if self.max_workers <= 0:
+            transaction.on_commit(lambda: self.job(func, *args))
+            return
+        transaction.on_commit(
+            lambda: self.get_executor().submit(self.run, self.job, func, *args)
+        )
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=wait)
+                self.executor = None
+
+
+def shutdown(wait=True):
+    '''Wait for pending jobs, e.g. before the database goes away.'''
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+def hold():
+    '''Keep the jobs of every pool until run_held().'''
+    for pool in pools:
+        pool.held = []
+
+
+def run_held():
+    '''Run the held jobs in this thread, in the order they came.'''
+    for pool in pools:
+        while pool.held:
+            func, args = pool.held.pop(0)
+            pool.job(func, *args)
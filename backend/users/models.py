@@ -36,6 +36,16 @@ class User(AbstractUser):
         choices=UserRole.choices,
         default=UserRole.USER,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -72,6 +82,12 @@ class Follow(models.Model):
                 name='unique_follow',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        )
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на {self.author}'